@@ -1,7 +1,7 @@
 #!/bin/bash
 
-# Apply migrations
-python manage.py migrate
+# Apply migrations; returns immediately when every migration is already recorded
+python manage.py migrate_if_needed
 
 # Start Django application
 exec "$@"
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'modernman.settings')
 
 application = get_asgi_application()
+
+from order.suggestions import warm_suggestion_index  # noqa: E402
+
+warm_suggestion_index()
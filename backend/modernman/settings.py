@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'order',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'order.middleware.RequestMetricsMiddleware',
+    'order.middleware.ReplicaPinningMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -97,15 +100,63 @@ DATABASES = {
     }
 }
 
+# Read replicas as comma-separated host[:port]; each becomes DATABASES['replica<n>'] with the primary's
+# name and credentials. Catalog reads are routed to them by order.db_router.ReplicaRouter.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').replace(' ', '').split(',')), 1):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        # Tests read their own writes through the replica alias
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['order.db_router.ReplicaRouter']
+# Assumed worst-case replication lag: after a write the client reads from the primary for this long
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         }
     }
 }
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 60 * 60))
+# Rating changes mark the product catalog changed at most once per this many seconds
+CATALOG_RATING_BUMP_DELAY = float(os.getenv('CATALOG_RATING_BUMP_DELAY', 60))
+SUGGESTIONS_REFRESH_INTERVAL = float(os.getenv('SUGGESTIONS_REFRESH_INTERVAL', 5))
+# Appended to catalog ETags; set it per release so clients refetch when response shapes change
+CATALOG_ETAG_SALT = os.getenv('CATALOG_ETAG_SALT', '')
+# `manage.py import_catalog` only copies local image paths from inside this directory
+CATALOG_IMPORT_ROOT = os.getenv('CATALOG_IMPORT_ROOT', os.path.join(BASE_DIR, 'imports'))
+
+# Relative p95/throughput change that makes `manage.py benchmark_routes --baseline` fail
+BENCHMARK_REGRESSION_THRESHOLD = float(os.getenv('BENCHMARK_REGRESSION_THRESHOLD', 0.2))
+
+# Request instrumentation (order.middleware.RequestMetricsMiddleware, scraped at /metrics)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 10))
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL', os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'))
+METRICS_REDIS_KEY = os.getenv('METRICS_REDIS_KEY', 'metrics:http')
+# Seconds a flush or scrape waits on Redis before giving up
+METRICS_REDIS_TIMEOUT = float(os.getenv('METRICS_REDIS_TIMEOUT', 0.5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Without a token, /metrics only answers these networks; behind a proxy on the same host set a token instead
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(',') if network.strip()
+]
+# Per-request timings in a Server-Timing response header, for development and load tests
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'False') == 'True'
+
+# Cart storage: 'order.cart_backends.DatabaseCartBackend' or 'order.cart_backends.RedisCartBackend'
+CART_BACKEND = os.getenv('CART_BACKEND', 'order.cart_backends.DatabaseCartBackend')
+CART_REDIS_TTL = int(os.getenv('CART_REDIS_TTL', 60 * 60 * 24 * 30))
+CART_SESSION_KEY = 'cart_token'
 #Rest_framework settings
 
 REST_FRAMEWORK = {
@@ -115,6 +166,8 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'order.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', 24)),
 }
 
 
@@ -166,6 +219,10 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Media serving (order/media.py): max-age for originals (hashed derivatives are immutable),
+# and the internal nginx location to hand files to with X-Accel-Redirect, if any
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', 60 * 60))
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 APPEND_SLASH = True
 AUTH_USER_MODEL = 'order.Customer'
@@ -173,9 +230,21 @@ AUTH_USER_MODEL = 'order.Customer'
 #Payment Intergrations
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+STRIPE_WEBHOOK_TOLERANCE = int(os.getenv('STRIPE_WEBHOOK_TOLERANCE', 300))
+# order.payments.FakeGateway runs the payment flow without network access
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'order.payments.StripeGateway')
 MPESA_CONSUMER_KEY = os.getenv('MPESA_CONSUMER_KEY')
 MPESA_CONSUMER_SECRET = os.getenv('MPESA_CONSUMER_SECRET')
 MPESA_ENV = os.getenv('MPESA_ENV')
+MPESA_BASE_URL = os.getenv('MPESA_BASE_URL')
+MPESA_SHORTCODE = os.getenv('MPESA_SHORTCODE')
+MPESA_PASSKEY = os.getenv('MPESA_PASSKEY')
+MPESA_CALLBACK_URL = os.getenv('MPESA_CALLBACK_URL', 'https://example.com/callback')
+MPESA_TIMEOUT = (float(os.getenv('MPESA_CONNECT_TIMEOUT', 3.05)), float(os.getenv('MPESA_READ_TIMEOUT', 15)))
+MPESA_POOL_SIZE = int(os.getenv('MPESA_POOL_SIZE', 10))
+MPESA_CALLBACK_QUEUE = os.getenv('MPESA_CALLBACK_QUEUE', 'mpesa:callbacks')
+MPESA_CALLBACK_BATCH_SIZE = int(os.getenv('MPESA_CALLBACK_BATCH_SIZE', 200))
 
 #Email intergrations
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -184,6 +253,21 @@ EMAIL_PORT = os.getenv('EMAIL_PORT')
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')  
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD') 
 EMAIL_USE_TLS = True  
+# Admin bulk mail: messages per SMTP connection and max messages per second (0 disables throttling)
+BULK_EMAIL_BATCH_SIZE = int(os.getenv('BULK_EMAIL_BATCH_SIZE', 100))
+BULK_EMAIL_RATE = float(os.getenv('BULK_EMAIL_RATE', 14))
+
+# Background task queue (see order/tasks.py and `manage.py run_tasks`)
+TASKS_ALWAYS_EAGER = os.getenv('TASKS_ALWAYS_EAGER', 'False') == 'True'
+TASKS_MAX_ATTEMPTS = int(os.getenv('TASKS_MAX_ATTEMPTS', 5))
+TASKS_RETRY_BACKOFF = int(os.getenv('TASKS_RETRY_BACKOFF', 10))
+TASKS_RETRY_BACKOFF_MAX = int(os.getenv('TASKS_RETRY_BACKOFF_MAX', 60 * 60))
+TASKS_VISIBILITY_TIMEOUT = int(os.getenv('TASKS_VISIBILITY_TIMEOUT', 15 * 60))
+TASKS_BATCH_SIZE = int(os.getenv('TASKS_BATCH_SIZE', 20))
+TASKS_POLL_INTERVAL = float(os.getenv('TASKS_POLL_INTERVAL', 1))
+
+# Processes rendering image derivatives (order/images.py); 0 renders in the calling process
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', os.cpu_count() or 1))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -15,16 +15,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, include, re_path
 from django.conf import settings
+from order.media import serve_media
+from order.metrics import metrics_view
 from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
 urlpatterns = [ 
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),   
+    path('api/async/', include('order.async_urls')),
     path('api/', include('order.urls')),
     path('admin/', admin.site.urls),
-    
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('metrics', metrics_view, name='metrics'),
+    re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>.+)$', serve_media, name='media'),
+]
@@ -1,40 +1,109 @@
-from django.contrib import admin
-from .models import Customer,Category,Product,Order,Cart,OrderItem,CartItem,CoverImages,MpesaTransaction
-from .utils.email_utils import send_email
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
+from .models import Customer,Category,Product,Order,Cart,OrderItem,CartItem,CoverImages,MpesaTransaction,StripePayment,Task
 from .forms import EmailMessageForm
-from django.core.mail import EmailMessage
+from .tasks import send_bulk_email_task
 
 def send_email_action(modeladmin, request, queryset):
-    form = EmailMessageForm(request.POST)
+    """
+    Asks for a subject and body, then queues one bulk mail task for the
+    selection. Sending, batching and throttling happen on the task worker.
+    """
+    select_across = request.POST.get('select_across', '0')
+    form = EmailMessageForm(request.POST if 'apply' in request.POST else None)
     if form.is_valid():
-        subject = form.cleaned_data['subject']
-        body = form.cleaned_data['body']
-        
-        for customer in queryset:
-            message = f"Dear {customer.username},\n\n{body}"
-            email = EmailMessage(subject, message, to=[customer.email])
-            email.send()
+        task_row = send_bulk_email_task.delay(
+            modeladmin.describe_selection(request), form.cleaned_data['subject'], form.cleaned_data['body'],
+        )
+        url = reverse('admin:order_task_change', args=[task_row.pk])
+        modeladmin.message_user(
+            request,
+            format_html('Queued email to {} customers; follow its progress on <a href="{}">{}</a>.',
+                        queryset.count(), url, task_row),
+            messages.SUCCESS,
+        )
+        return None
+    return TemplateResponse(request, 'admin/order/customer/send_email.html', {
+        **modeladmin.admin_site.each_context(request),
+        'title': 'Send email',
+        'opts': modeladmin.model._meta,
+        'form': form,
+        'queryset': queryset,
+        'count': queryset.count(),
+        'select_across': select_across,
+        'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    })
 
 send_email_action.short_description = "Send Email"
 
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'is_active', 'date_joined')
+    search_fields = ('username', 'email')
+    list_filter = ('is_active',)
+    actions = [send_email_action]
+
+    def describe_selection(self, request):
+        """
+        The action's selection as JSON for a task: the ticked primary keys,
+        which are at most one changelist page, or the changelist's filter
+        and search parameters when every match is selected.
+        """
+        if request.POST.get('select_across') == '1':
+            return {'params': request.GET.dict()}
+        return {'pks': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)}
+
+    def selected_queryset(self, selection):
+        """Rebuilds the queryset described by ``describe_selection``."""
+        if 'pks' in selection:
+            return self.model.objects.filter(pk__in=selection['pks'])
+        params = selection['params']
+        queryset = self.model.objects.filter(**{
+            lookup: value for lookup, value in params.items() if lookup.split('__', 1)[0] in self.list_filter
+        })
+        queryset, may_have_duplicates = self.get_search_results(None, queryset, params.get(SEARCH_VAR, ''))
+        return queryset.distinct() if may_have_duplicates else queryset
+
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'price', 'category', 'image', 'discount_percentage']
-    search_fields = ['name', 'description']
+    list_display = ['name', 'sku', 'price', 'category', 'image', 'discount_percentage']
+    search_fields = ['name', 'sku', 'description']
     readonly_fields = ['discounted_price'] 
     
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'total', 'is_ordered', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('is_ordered', 'created_at')
+    readonly_fields = ('total',)
+
 class MpesaTransactionAdmin(admin.ModelAdmin):
     list_display = ('phone_number', 'amount', 'transaction_id', 'status', 'transaction_date')
     search_fields = ('user__username', 'phone_number', 'transaction_id', 'status')
     list_filter = ('status', 'transaction_date')
     
+class StripePaymentAdmin(admin.ModelAdmin):
+    list_display = ('intent_id', 'user', 'amount', 'currency', 'status', 'created_at')
+    search_fields = ('intent_id', 'idempotency_key', 'user__username')
+    list_filter = ('status', 'currency')
+    readonly_fields = ('client_secret', 'last_event_id', 'last_event_created')
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
+
 # Register your models here.
-admin.site.register(Customer)
+admin.site.register(Customer, CustomerAdmin)
 admin.site.register(Category)
 admin.site.register(Product,ProductAdmin)
-admin.site.register(Order)
+admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem)
 admin.site.register(Cart)
 admin.site.register(CartItem)
 admin.site.register(CoverImages)
 admin.site.register(MpesaTransaction, MpesaTransactionAdmin)
-
+admin.site.register(StripePayment, StripePaymentAdmin)
+admin.site.register(Task, TaskAdmin)
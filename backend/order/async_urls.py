@@ -0,0 +1,12 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('products/', async_views.product_list, name='async-product-list'),
+    path('products/<str:category>/', async_views.product_list, name='async-product-list-by-category'),
+    path('discounted-products/', async_views.discounted_product_list, name='async-discounted-products'),
+    path('search/', async_views.product_search, name='async-product-search'),
+    path('suggestions/', async_views.search_suggestions, name='async-search-suggestions'),
+    path('favorites/', async_views.favorite_list, name='async-favorite-list'),
+    path('mpesa/', async_views.mpesa_charge, name='async-mpesa-charge'),
+]
@@ -0,0 +1,150 @@
+"""
+Async counterparts of the read-heavy catalog views and of M-Pesa initiation,
+mounted under /api/async/ for ASGI deployments
+(``uvicorn modernman.asgi:application``).
+
+They return the same JSON as the DRF views they mirror and fetch rows with
+the async ORM. Work that is still synchronous (the search and suggestion
+indexes, JWT user lookup, the Daraja client) runs in a thread through
+sync_to_async.
+"""
+import json
+import requests
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django_filters.utils import translate_validation
+from rest_framework.exceptions import APIException
+from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import Product, ProductDiscountFilter
+from .pagination import KeysetPagination
+from .search import search_products
+from .serializers import MpesaTransactionSerializer, ProductSerializer
+from .suggestions import suggestion_index
+from .utils.cache_utils import aget_or_set_catalog, catalog_conditional, PRODUCTS
+from .utils.mpesa_utils import AsyncMpesaClient, record_mpesa_charge, stk_push_error
+from .views import PRODUCT_ORDERING_FIELDS
+
+class Listing:
+    """Stands in for a DRF view so KeysetPagination can read the ordering configuration."""
+    def __init__(self, filter_backends=(), ordering_fields=None, ordering=None):
+        self.filter_backends = list(filter_backends)
+        self.ordering_fields = ordering_fields
+        self.ordering = ordering
+
+CATALOG_LISTING = Listing([OrderingFilter], PRODUCT_ORDERING_FIELDS)
+SEARCH_LISTING = Listing(ordering='-rank')
+
+async def paginate(request, queryset, listing):
+    """Async KeysetPagination: same cursors and response shape as the DRF views."""
+    paginator = KeysetPagination()
+    drf_request = Request(request)
+    rows = paginator.page_queryset(queryset, drf_request, listing)
+    page = paginator.paginate_results([row async for row in rows])
+    return {
+        'next': paginator.get_next_link(),
+        'next_cursor': paginator.next_cursor,
+        'results': ProductSerializer(page, many=True, context={'request': request}).data,
+    }
+
+def json_response(data, **kwargs):
+    """JsonResponse with DRF's encoder, so numbers render exactly as in the sync API."""
+    return JsonResponse(data, encoder=JSONEncoder, **kwargs)
+
+def error(exc):
+    return json_response({'detail': str(exc.detail)}, status=exc.status_code)
+
+async def authenticate(request):
+    """Returns the JWT user, None when no token was sent, or raises AuthenticationFailed."""
+    result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    return result[0] if result else None
+
+async def catalog_page(request, queryset, endpoint, extra=None):
+    filterset = ProductDiscountFilter(request.GET, queryset=queryset)
+    if not filterset.is_valid():
+        # The 400 DjangoFilterBackend gives the sync views
+        return json_response(translate_validation(filterset.errors).detail, status=400)
+    queryset = filterset.qs
+    try:
+        data = await aget_or_set_catalog(
+            PRODUCTS, endpoint, request, lambda: paginate(request, queryset, CATALOG_LISTING), extra=extra,
+        )
+    except APIException as exc:
+        return error(exc)
+    return json_response(data)
+
+@require_GET
+@catalog_conditional(PRODUCTS, renderers=[JSONRenderer])
+async def product_list(request, category=None):
+    queryset = Product.objects.for_listing()
+    if request.GET.get('category') is not None:
+        queryset = queryset.filter(category__name=request.GET['category'])
+    return await catalog_page(request, queryset, 'async-product-list', {'category': category} if category else None)
+
+@require_GET
+@catalog_conditional(PRODUCTS, renderers=[JSONRenderer])
+async def discounted_product_list(request):
+    queryset = Product.objects.for_listing().filter(discount_percentage__gt=0)
+    return await catalog_page(request, queryset, 'async-discounted-products')
+
+@require_GET
+@catalog_conditional(PRODUCTS, renderers=[JSONRenderer])
+async def product_search(request):
+    # The fallback backend may rebuild its index from the database first
+    products = await sync_to_async(search_products)(request.GET.get('query', ''), Product.objects.for_listing())
+    try:
+        return json_response(await paginate(request, products, SEARCH_LISTING))
+    except APIException as exc:
+        return error(exc)
+
+@require_GET
+@catalog_conditional(PRODUCTS, version=suggestion_index.current_version, renderers=[JSONRenderer])
+async def search_suggestions(request):
+    suggestions = await sync_to_async(suggestion_index.lookup)(request.GET.get('query', ''))
+    return json_response([
+        dict(item, thumbnail=item['thumbnail'] and request.build_absolute_uri(item['thumbnail']))
+        for item in suggestions
+    ], safe=False)
+
+@require_GET
+async def favorite_list(request):
+    try:
+        user = await authenticate(request)
+    except APIException as exc:
+        return error(exc)
+    if user is None:
+        return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+    try:
+        return json_response(await paginate(request, user.favorites.for_listing(), CATALOG_LISTING))
+    except APIException as exc:
+        return error(exc)
+
+@csrf_exempt
+@require_POST
+async def mpesa_charge(request):
+    """Async MpesaChargeView; the event loop keeps serving requests while the STK push is in flight."""
+    try:
+        user = await authenticate(request)
+        data = json.loads(request.body or b'{}')
+    except APIException as exc:
+        return error(exc)
+    except ValueError:
+        return json_response({'detail': 'Invalid JSON'}, status=400)
+    serializer = MpesaTransactionSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=400)
+    try:
+        response = await AsyncMpesaClient().stk_push(
+            serializer.validated_data['phone_number'], serializer.validated_data['amount'],
+            data.get('account_reference', 'Test123'), data.get('transaction_desc', 'Payment for XYZ'),
+        )
+    except requests.RequestException as exc:
+        message, status_code = stk_push_error(exc)
+        return json_response({'detail': message}, status=status_code)
+    await sync_to_async(record_mpesa_charge)(response, serializer.validated_data, user)
+    return json_response(response)
@@ -0,0 +1,265 @@
+import asyncio
+import io
+import json
+import math
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import AsyncClient, Client
+from .models import Cart, CartItem, Category, Customer, Order, OrderItem, Product, Rating
+from .payments import FakeGateway
+from .search import refresh_search_vectors
+from .utils.cache_utils import bump_catalog_version, PRODUCTS
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(samples, elapsed):
+    """Turns (seconds, status) samples from one run into throughput and latency figures in ms."""
+    latencies = sorted(seconds * 1000 for seconds, status in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for seconds, status in samples if status >= 400),
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(latencies) if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+def _resolve(value, index):
+    return value(index) if callable(value) else value
+
+def run_wsgi(path, requests, concurrency, headers=None, method='get', data=None):
+    """
+    Drives ``path`` through Django's WSGI handler from ``concurrency`` threads,
+    the way a threaded WSGI server would.
+
+    ``path``, ``headers`` and ``data`` may be callables taking the request
+    index, so each request can use its own user or payload. ``data`` is
+    sent as JSON.
+    """
+    local = threading.local()
+
+    def request(index):
+        if not hasattr(local, 'client'):
+            local.client = Client(raise_request_exception=False)
+        kwargs = {'headers': _resolve(headers, index) or {}}
+        if data is not None:
+            kwargs.update(data=json.dumps(_resolve(data, index), cls=DjangoJSONEncoder), content_type='application/json')
+        url = _resolve(path, index)
+        started = time.perf_counter()
+        response = getattr(local.client, method)(url, **kwargs)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(request, range(requests)))
+    return summarize(samples, time.perf_counter() - started)
+
+def run_asgi(path, requests, concurrency, headers=None):
+    """Drives ``path`` through Django's ASGI handler with ``concurrency`` requests in flight on one event loop."""
+    headers = headers or {}
+
+    async def main():
+        client = AsyncClient(raise_request_exception=False)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with slots:
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(request() for _ in range(requests)))
+        return summarize(samples, time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+BENCHMARK_PREFIX = 'bench-'
+BENCHMARK_PASSWORD = 'bench-password'
+ADJECTIVES = ('Classic', 'Slim', 'Linen', 'Wool', 'Oxford', 'Silk', 'Leather', 'Tailored', 'Navy', 'Charcoal')
+NOUNS = {'suits': 'Suit', 'shirts': 'Shirt', 'neckwear': 'Tie', 'shoes': 'Loafer'}
+
+def seed_dataset(categories=4, products=1000, customers=200, carts=100, orders=500, ratings=2000,
+                 favorites=5, batch_size=1000, seed=0):
+    """
+    Bulk-inserts a reproducible synthetic catalog and customer base.
+
+    Customers are named ``bench-<n>`` and share BENCHMARK_PASSWORD (hashed
+    once). Returns the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    choices = [name for name, label in Category.CATEGORY_CHOICES]
+    category_rows = Category.objects.bulk_create([Category(name=choices[i % len(choices)]) for i in range(categories)])
+
+    product_rows = Product.objects.bulk_create([
+        Product(
+            name=f'{rng.choice(ADJECTIVES)} {NOUNS[category.name]} {i}',
+            description=f'{rng.choice(ADJECTIVES)} {category.get_name_display().lower()} for every occasion',
+            price=Decimal(rng.randrange(1000, 50000)) / 100,
+            discount_percentage=rng.choice((0, 0, 0, 10, 15, 25, 40)),
+            category=category,
+        )
+        for i, category in ((i, rng.choice(category_rows)) for i in range(products))
+    ], batch_size=batch_size)
+
+    start = Customer.objects.filter(username__startswith=BENCHMARK_PREFIX).count()
+    password = make_password(BENCHMARK_PASSWORD)
+    customer_rows = Customer.objects.bulk_create([
+        Customer(username=f'{BENCHMARK_PREFIX}{n}', email=f'{BENCHMARK_PREFIX}{n}@example.com', password=password)
+        for n in range(start, start + customers)
+    ], batch_size=batch_size)
+
+    Favorite = Customer.favorites.through
+    Favorite.objects.bulk_create([
+        Favorite(customer_id=customer.pk, product_id=product.pk)
+        for customer in customer_rows
+        for product in rng.sample(product_rows, min(favorites, len(product_rows)))
+    ], batch_size=batch_size)
+
+    cart_rows = Cart.objects.bulk_create([Cart(user=customer) for customer in customer_rows[:carts]])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=quantity, subtotal=product.price * quantity)
+        for cart in cart_rows
+        for product, quantity in ((product, rng.randint(1, 3)) for product in rng.sample(product_rows, min(3, len(product_rows))))
+    ], batch_size=batch_size)
+
+    order_rows = Order.objects.bulk_create([
+        Order(user=rng.choice(customer_rows), is_ordered=True) for _ in range(orders if customer_rows else 0)
+    ], batch_size=batch_size)
+    items = [
+        OrderItem(order=order, product=product, quantity=quantity, subtotal=product.apply_discount() * quantity)
+        for order in order_rows
+        for product, quantity in ((product, rng.randint(1, 3)) for product in rng.sample(product_rows, min(2, len(product_rows))))
+    ]
+    OrderItem.objects.bulk_create(items, batch_size=batch_size)
+    totals = {}
+    for item in items:
+        totals[item.order_id] = totals.get(item.order_id, 0) + item.subtotal
+    for order in order_rows:
+        order.total = totals.get(order.pk, 0)
+    Order.objects.bulk_update(order_rows, ['total'], batch_size=batch_size)
+
+    pairs = {(rng.choice(product_rows).pk, rng.choice(customer_rows).pk) for _ in range(ratings if customer_rows and product_rows else 0)}
+    Rating.objects.bulk_create([
+        Rating(product_id=product_id, user_id=user_id, rating=rng.randint(1, 4)) for product_id, user_id in pairs
+    ], batch_size=batch_size)
+    # bulk_create skips the signals that maintain rating aggregates, search vectors and the catalog version
+    call_command('recompute_ratings', stdout=io.StringIO())
+    refresh_search_vectors()
+    bump_catalog_version(PRODUCTS)
+
+    return {
+        'categories': len(category_rows), 'products': len(product_rows), 'customers': len(customer_rows),
+        'carts': len(cart_rows), 'orders': len(order_rows), 'ratings': len(pairs),
+    }
+
+class Route:
+    """One benchmarked request; ``path``, ``data`` and ``headers`` may be callables of the request index."""
+    def __init__(self, name, path, method='get', data=None, headers=None, auth=False, external=False):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.headers = headers
+        self.auth = auth
+        self.external = external
+
+def build_routes(fixtures):
+    """
+    Scenarios for the named routes in order/urls.py, driven with the rows in
+    ``fixtures`` (see the benchmark_routes command). ``fixtures['run']`` is
+    a timestamp that keeps usernames, idempotency keys and event ids unique
+    across runs. Routes without the rows they need are left out.
+    """
+    products, customers, images = fixtures['products'], fixtures['customers'], fixtures['images']
+    product = lambda i: products[i % len(products)]
+    customer = lambda i: customers[i % len(customers)]
+    run = fixtures['run']
+
+    def stripe_event(i):
+        return FakeGateway.event(f'pi_bench_{run}_{i}', 'payment_intent.succeeded', f'evt_bench_{run}_{i}', created=run)
+
+    def stripe_signature(i):
+        # run_wsgi encodes the body the same way, so the signature matches
+        return {'Stripe-Signature': FakeGateway.sign(json.dumps(stripe_event(i), cls=DjangoJSONEncoder).encode())}
+
+    def mpesa_callback(i):
+        return {'Body': {'stkCallback': {
+            'CheckoutRequestID': f'ws_CO_bench_{run}_{i}', 'ResultCode': 0, 'ResultDesc': 'Accepted',
+            'CallbackMetadata': {'Item': [
+                {'Name': 'Amount', 'Value': 1}, {'Name': 'MpesaReceiptNumber', 'Value': f'BENCH{run}{i}'},
+                {'Name': 'PhoneNumber', 'Value': 254700000000},
+            ]},
+        }}}
+
+    routes = [
+        Route('api-root', '/api/'),
+        Route('coverimages-list', '/api/images/'),
+        Route('coverimages-detail', lambda i: f'/api/images/{images[i % len(images)]}/') if images else None,
+        Route('product-list-create', '/api/products/?ordering=-final_price'),
+        Route('product_list_by_category', lambda i: f"/api/products/{fixtures['categories'][i % len(fixtures['categories'])]}/"),
+        Route('product-detail', lambda i: f'/api/products/{product(i)}/'),
+        Route('product-rating', lambda i: f'/api/products/{product(i)}/ratings/', 'post', lambda i: {'rating': i % 4 + 1}, auth=True),
+        Route('discounted-products', '/api/discounted-products/?min_price=20'),
+        Route('register', '/api/register/', 'post', lambda i: {
+            'username': f'{BENCHMARK_PREFIX}new-{run}-{i}', 'email': f'{BENCHMARK_PREFIX}new-{run}-{i}@example.com',
+            'password': BENCHMARK_PASSWORD, 'confirm_password': BENCHMARK_PASSWORD,
+        }),
+        Route('product-search', '/api/search/?query=linen shirt'),
+        Route('cart-create', '/api/cart/add/', 'post', lambda i: {'user': customer(i)['id']}),
+        Route('order-create', '/api/cart/checkout/', 'post', lambda i: {'user': customer(i)['id']}),
+        Route('token_obtain_pair', '/api/token/', 'post', lambda i: {
+            'username': customer(i)['username'], 'password': BENCHMARK_PASSWORD,
+        }),
+        Route('stripe_charge', '/api/stripe/', 'post', lambda i: {
+            'amount': 1000 + i, 'currency': 'usd', 'idempotency_key': f'bench-{run}-{i}',
+        }),
+        Route('stripe_webhook', '/api/stripe/webhook/', 'post', stripe_event, stripe_signature),
+        Route('mpesa_charge', '/api/mpesa/', 'post', lambda i: {
+            'phone_number': '254700000000', 'amount': 1, 'reference': 'bench', 'description': 'Benchmark',
+        }, external=True),
+        Route('mpesa_callback', '/api/mpesa/callback/', 'post', mpesa_callback),
+        Route('stripe-public-key', '/api/stripe-public-key/'),
+        Route('mpesa-public-key', '/api/mpesa-public-key/'),
+        Route('search_suggestions', '/api/suggestions/?query=li'),
+        Route('send_email', '/api/send-email/', 'post', lambda i: {
+            'to': customer(i)['email'], 'subject': 'Benchmark', 'text': 'Benchmark message',
+        }),
+        Route('favorite_list', '/api/favorites/', auth=True),
+        Route('favorite_count', '/api/favorites/count/', auth=True),
+    ]
+    return [route for route in routes if route is not None]
+
+def find_regressions(results, baseline, threshold, min_delta_ms=1.0):
+    """
+    Compares two result lists by route. A route regresses when its p95
+    grows, or its throughput falls, by more than ``threshold`` (a fraction),
+    or when it errors more often. ``min_delta_ms`` ignores p95 jitter on
+    very fast routes.
+    """
+    previous = {row['route']: row for row in baseline}
+    regressions = []
+    for row in results:
+        before = previous.get(row['route'])
+        if before is None:
+            continue
+        if row['p95_ms'] - before['p95_ms'] > max(before['p95_ms'] * threshold, min_delta_ms):
+            regressions.append(f"{row['route']}: p95 {before['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms")
+        if row['rps'] < before['rps'] * (1 - threshold):
+            regressions.append(f"{row['route']}: throughput {before['rps']:.1f} -> {row['rps']:.1f} req/s")
+        if row['errors'] > before['errors']:
+            regressions.append(f"{row['route']}: errors {before['errors']} -> {row['errors']}")
+    return regressions
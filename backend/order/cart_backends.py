@@ -0,0 +1,156 @@
+import uuid
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+def get_cart_backend():
+    return import_string(settings.CART_BACKEND)()
+
+class DatabaseCartBackend:
+    """Keeps cart lines in the CartItem table (the default)."""
+
+    def add(self, cart, product, quantity=1):
+        from .models import CartItem
+        CartItem.objects.add_or_increment(cart, product, quantity)
+
+    def add_for_user(self, user, product, quantity=1):
+        from .models import CartItem
+        CartItem.objects.add_for_user(user, product, quantity)
+
+    def remove(self, cart, product):
+        cart.cartitem_set.filter(product=product).delete()
+
+    def items(self, cart):
+        return dict(cart.cartitem_set.values_list('product_id', 'quantity'))
+
+    def take(self, cart):
+        return self.items(cart)
+
+    def finalize(self, cart, lines):
+        cart.cartitem_set.filter(product_id__in=list(lines)).delete()
+
+    def restore(self, cart, lines):
+        # The rollback of the checkout brings the rows back
+        pass
+
+    def persist(self, cart):
+        pass
+
+class RedisCartBackend:
+    """
+    Keeps active carts in Redis hashes of product id -> quantity.
+
+    Carts are keyed by user, or by an anonymous token kept in the session
+    until login, when ``merge`` folds them into the user's cart. The
+    Cart/CartItem tables are only written by ``Cart.checkout()`` and by an
+    explicit ``Cart.save_items()``.
+    """
+    key_prefix = 'cart'
+
+    # Reads and empties the cart in one step, so a second checkout of the same
+    # cart can never see the lines again.
+    take_script = """
+    local lines = redis.call('HGETALL', KEYS[1])
+    redis.call('DEL', KEYS[1])
+    return lines
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django_redis import get_redis_connection
+            self._client = get_redis_connection('default')
+        return self._client
+
+    def key(self, cart):
+        return self.user_key(cart.user_id)
+
+    def user_key(self, user_id):
+        return f'{self.key_prefix}:user:{user_id}'
+
+    def anonymous_key(self, token):
+        return f'{self.key_prefix}:anon:{token}'
+
+    def _increment(self, key, product_id, quantity):
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, product_id, quantity)
+        pipe.expire(key, settings.CART_REDIS_TTL)
+        pipe.execute()
+
+    def add(self, cart, product, quantity=1):
+        self._increment(self.key(cart), getattr(product, 'pk', product), quantity)
+
+    def add_for_user(self, user, product, quantity=1):
+        # The Cart row is only needed at checkout, which creates it
+        self._increment(self.user_key(user.pk), getattr(product, 'pk', product), quantity)
+
+    def add_anonymous(self, token, product, quantity=1):
+        self._increment(self.anonymous_key(token), getattr(product, 'pk', product), quantity)
+
+    def remove(self, cart, product):
+        self.client.hdel(self.key(cart), getattr(product, 'pk', product))
+
+    def items(self, cart):
+        return {int(pk): int(quantity) for pk, quantity in self.client.hgetall(self.key(cart)).items()}
+
+    def take(self, cart):
+        """
+        Removes the lines from Redis while Cart.checkout() holds the cart row
+        lock; ``restore`` puts them back if the checkout fails.
+        """
+        values = self.client.eval(self.take_script, 1, self.key(cart))
+        return {int(pk): int(quantity) for pk, quantity in zip(values[::2], values[1::2])}
+
+    def finalize(self, cart, lines):
+        pass
+
+    def restore(self, cart, lines):
+        """Adds the lines back on top of anything added while the checkout ran."""
+        if lines:
+            pipe = self.client.pipeline()
+            for product_id, quantity in lines.items():
+                pipe.hincrby(self.key(cart), product_id, quantity)
+            pipe.expire(self.key(cart), settings.CART_REDIS_TTL)
+            pipe.execute()
+
+    def merge(self, token, cart):
+        lines = self.client.hgetall(self.anonymous_key(token))
+        if lines:
+            pipe = self.client.pipeline()
+            for product_id, quantity in lines.items():
+                pipe.hincrby(self.key(cart), product_id, int(quantity))
+            pipe.expire(self.key(cart), settings.CART_REDIS_TTL)
+            pipe.execute()
+        self.client.delete(self.anonymous_key(token))
+
+    def persist(self, cart):
+        from .models import CartItem, Product
+        lines = self.items(cart)
+        prices = dict(Product.objects.filter(pk__in=list(lines)).values_list('pk', 'price'))
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=pk, quantity=quantity, subtotal=quantity * prices[pk])
+                for pk, quantity in lines.items() if pk in prices
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'subtotal'],
+        )
+        cart.cartitem_set.exclude(product_id__in=list(prices)).delete()
+
+def anonymous_cart_token(request):
+    token = request.session.get(settings.CART_SESSION_KEY)
+    if token is None:
+        token = request.session[settings.CART_SESSION_KEY] = uuid.uuid4().hex
+    return token
+
+def merge_anonymous_cart(request, user):
+    """Folds the session's anonymous cart, if any, into ``user``'s cart."""
+    from .models import Cart
+    session = getattr(request, 'session', None)
+    token = session.pop(settings.CART_SESSION_KEY, None) if session is not None else None
+    backend = get_cart_backend()
+    if token and hasattr(backend, 'merge'):
+        backend.merge(token, Cart.objects.for_user(user))
@@ -0,0 +1,262 @@
+"""
+Streaming CSV/JSONL catalog import and export, keyed by Product.sku.
+
+Rows are read lazily and written in batches: one SELECT for the existing
+images of a batch and INSERT ... ON CONFLICT (sku) DO UPDATE, so
+memory stays flat whatever the file size. Images are fetched or copied in
+a thread pool under content-addressed names, which makes re-imports skip
+files that are already stored.
+"""
+import csv
+import hashlib
+import json
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import requests
+from requests.adapters import HTTPAdapter
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from .models import Category, Product
+from .search import refresh_search_vectors
+from .utils.cache_utils import bump_catalog_version, PRODUCTS
+
+FIELDS = ('sku', 'name', 'description', 'price', 'category', 'discount_percentage', 'image')
+COLUMNS = ('sku', 'name', 'description', 'price', 'category_id', 'discount_percentage', 'image')
+# Columns without a database default, written as literals for new rows
+NEW_ROW_DEFAULTS = {'image_variants': "'{}'", 'average_rating': '0', 'rating_sum': '0', 'rating_count': '0'}
+IMAGE_DIRECTORY = 'products/imported'
+IMAGE_TIMEOUT = (3.05, 30)
+
+def detect_format(path, format=None):
+    if format:
+        return format
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def read_rows(stream, format):
+    """Yields ``(line_number, dict)`` without loading the file."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                raise ValueError(f"line {number}: {exc}")
+            if not isinstance(row, dict):
+                raise ValueError(f"line {number}: expected a JSON object, got {type(row).__name__}")
+            yield number, row
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+class CategoryMap:
+    """Category name -> pk, loaded once; missing categories with a valid choice are created on first use."""
+    def __init__(self):
+        self.choices = {name for name, label in Category.CATEGORY_CHOICES}
+        self.ids = {}
+        for pk, name in Category.objects.order_by('-pk').values_list('pk', 'name'):
+            self.ids[name] = pk
+
+    def resolve(self, name):
+        name = (name or '').strip().lower()
+        if name not in self.choices:
+            raise ValueError(f"unknown category {name!r}")
+        if name not in self.ids:
+            self.ids[name] = Category.objects.create(name=name).pk
+        return self.ids[name]
+
+def clean_row(row, categories):
+    """Validates one input row and returns the Product field values, or raises ValueError."""
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not sku or not name:
+        raise ValueError("sku and name are required")
+    try:
+        price = Decimal(str(row.get('price', '')).strip()).quantize(Decimal('0.01'))
+        discount = int(row.get('discount_percentage') or 0)
+    except (InvalidOperation, ValueError):
+        raise ValueError("price and discount_percentage must be numbers")
+    if price < 0 or not 0 <= discount <= 100:
+        raise ValueError("price must be positive and discount_percentage between 0 and 100")
+    return {
+        'sku': sku[:64],
+        'name': name[:255],
+        'description': str(row.get('description') or ''),
+        'price': price,
+        'category_id': categories.resolve(row.get('category')),
+        'discount_percentage': discount,
+        'image': str(row.get('image') or '').strip(),
+    }
+
+def upsert_products(rows):
+    """
+    INSERT ... ON CONFLICT (sku) DO UPDATE for tuples in COLUMNS order.
+
+    Written as SQL rather than bulk_create(update_conflicts=True): preparing
+    every field of every model instance made up most of a large import.
+    """
+    quote = connection.ops.quote_name
+    columns = [*COLUMNS, *NEW_ROW_DEFAULTS]
+    placeholder = '(' + ', '.join(['%s'] * len(COLUMNS) + list(NEW_ROW_DEFAULTS.values())) + ')'
+    updates = ', '.join(f'{quote(column)} = EXCLUDED.{quote(column)}' for column in COLUMNS[1:])
+    chunk_size = len(rows) or 1
+    if connection.features.max_query_params:
+        chunk_size = max(connection.features.max_query_params // len(COLUMNS), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            cursor.execute(
+                f"INSERT INTO {quote(Product._meta.db_table)} ({', '.join(map(quote, columns))}) "
+                f"VALUES {', '.join([placeholder] * len(chunk))} "
+                f"ON CONFLICT ({quote('sku')}) DO UPDATE SET {updates}",
+                [value for row in chunk for value in row],
+            )
+
+def image_name(source):
+    digest = hashlib.sha1(source.encode()).hexdigest()[:12]
+    filename = posixpath.basename(source.split('?', 1)[0]) or 'image'
+    return posixpath.join(IMAGE_DIRECTORY, f'{digest}-{filename}')
+
+def import_path(source, image_root=None):
+    """Resolves a local image path, refusing anything (.., absolute paths, symlinks) outside the import root."""
+    root = os.path.realpath(image_root or settings.CATALOG_IMPORT_ROOT)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root:
+        raise SuspiciousFileOperation(f"{source!r} is outside the import root")
+    return path
+
+def store_image(source, image_root=None, session=None):
+    """
+    Returns the storage name for an image column value: names already in
+    storage are kept, URLs are downloaded and local paths copied. Local
+    paths must resolve inside ``image_root`` (CATALOG_IMPORT_ROOT by
+    default); anything else raises SuspiciousFileOperation.
+    """
+    remote = source.startswith(('http://', 'https://'))
+    if not remote and not os.path.isabs(source) and default_storage.exists(source):
+        return source
+    name = image_name(source)
+    if default_storage.exists(name):
+        return name
+    if remote:
+        response = (session or requests).get(source, timeout=IMAGE_TIMEOUT)
+        response.raise_for_status()
+        content = response.content
+    else:
+        with open(import_path(source, image_root), 'rb') as handle:
+            content = handle.read()
+    return default_storage.save(name, ContentFile(content))
+
+class CatalogImporter:
+    """
+    Upserts products by SKU in batches, then bumps the catalog version so
+    caches and the suggestion index refresh. An empty image column keeps the
+    product's current image. Rows that fail validation, or whose image
+    cannot be fetched, are skipped and reported in ``errors``.
+    """
+    def __init__(self, batch_size=1000, image_workers=8, image_root=None, max_errors=100):
+        self.batch_size = batch_size
+        self.image_workers = image_workers
+        self.image_root = image_root
+        self.max_errors = max_errors
+        self.categories = CategoryMap()
+        self.errors = []
+        self.error_count = 0
+        self.created = 0
+        self.updated = 0
+        self.images = 0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(f"line {line}: {message}")
+
+    def run(self, rows, progress=None):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(self.image_workers, 1))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        with ThreadPoolExecutor(max_workers=max(self.image_workers, 1)) as pool:
+            for batch in batched(rows, self.batch_size):
+                self.import_batch(batch, pool, session)
+                if progress:
+                    progress(self)
+        if self.created or self.updated:
+            bump_catalog_version(PRODUCTS)
+        return self
+
+    def import_batch(self, batch, pool, session):
+        cleaned = {}
+        for line, row in batch:
+            try:
+                values = clean_row(row, self.categories)
+            except ValueError as exc:
+                self.error(line, exc)
+                continue
+            # A SKU repeated within a batch keeps its last row, as a sequential import would
+            cleaned[values['sku']] = (line, values)
+
+        existing = dict(Product.objects.filter(sku__in=cleaned).values_list('sku', 'image'))
+        sources = {values['image'] for line, values in cleaned.values() if values['image']}
+        stored = dict(zip(sources, pool.map(self._store_image, sources, [session] * len(sources))))
+
+        rows = []
+        for sku, (line, values) in cleaned.items():
+            source = values['image']
+            if source and isinstance(stored[source], Exception):
+                self.error(line, f"image {source}: {stored[source]}")
+                continue
+            values['image'] = stored[source] if source else existing.get(sku) or None
+            self.images += bool(source)
+            rows.append(tuple(values[column] for column in COLUMNS))
+
+        with transaction.atomic():
+            upsert_products(rows)
+            # The upsert bypasses the post_save handler that maintains the search vector
+            refresh_search_vectors(Product.objects.filter(sku__in=[row[0] for row in rows]))
+        self.updated += sum(1 for row in rows if row[0] in existing)
+        self.created += sum(1 for row in rows if row[0] not in existing)
+
+    def _store_image(self, source, session):
+        try:
+            return store_image(source, self.image_root, session)
+        except (OSError, SuspiciousFileOperation, requests.RequestException) as exc:
+            return exc
+
+def export_rows(queryset=None, chunk_size=2000):
+    """
+    Yields export rows. iterator() uses a server-side cursor on PostgreSQL,
+    so only ``chunk_size`` rows are held at a time.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('pk').values_list(
+        'sku', 'name', 'description', 'price', 'category__name', 'discount_percentage', 'image',
+    ).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield dict(zip(FIELDS, row))
+
+def write_rows(rows, stream, format):
+    count = 0
+    if format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, default=str) + '\n')
+            count += 1
+    return count
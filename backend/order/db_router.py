@@ -0,0 +1,109 @@
+"""
+Read-replica routing for catalog reads.
+
+ReplicaRouter sends reads of the catalog models to one replica per request
+and everything else, including every write, to the primary. Routing state
+lives in a context variable set by ReplicaPinningMiddleware, like the
+request metrics, so management commands and task workers always use the
+primary.
+
+Replicas lag behind the primary, so a replica is only used when it cannot
+return something older than the client has reason to expect:
+
+* after a write, the rest of the request and the client's requests for
+  the next DB_REPLICA_MAX_LAG seconds read from the primary. Clients are
+  told apart by their Authorization header or session cookie;
+* while the catalog version is younger than DB_REPLICA_MAX_LAG, catalog
+  reads go to the primary too, so cache fills and ETag-tagged responses
+  never pair the new version with old rows.
+"""
+import contextvars
+import hashlib
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from .utils.cache_utils import _version_key, IMAGES, PRODUCTS
+
+# Models a replica may serve, with the catalog version namespace bumped when they change
+CATALOG_MODELS = {
+    'order.Product': PRODUCTS,
+    'order.Category': PRODUCTS,
+    'order.CoverImages': IMAGES,
+}
+
+class RoutingState:
+    __slots__ = ('replica', 'client', 'pinned', 'wrote', 'settled')
+
+    def __init__(self, replica, client=None):
+        self.replica = replica
+        self.client = client
+        self.pinned = replica is None
+        self.wrote = False
+        # Namespaces whose catalog version is old enough for the replica, checked once per request
+        self.settled = None
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+def start_request(client=None):
+    """Picks the request's replica; ``client`` identifies whom a write pins to the primary."""
+    replicas = settings.DATABASE_REPLICAS
+    state = RoutingState(random.choice(replicas) if replicas else None, client)
+    return state, _state.set(state)
+
+def end_request(token):
+    _state.reset(token)
+
+def _pin_key(client):
+    return f'db:pinned:{hashlib.sha256(client.encode()).hexdigest()}'
+
+def pin_client(client):
+    cache.set(_pin_key(client), 1, settings.DB_REPLICA_MAX_LAG)
+
+async def apin_client(client):
+    await cache.aset(_pin_key(client), 1, settings.DB_REPLICA_MAX_LAG)
+
+def _settled_namespaces(state):
+    keys = {_version_key(namespace): namespace for namespace in set(CATALOG_MODELS.values())}
+    if state.client:
+        keys[_pin_key(state.client)] = None
+    values = cache.get_many(keys)
+    if state.client and _pin_key(state.client) in values:
+        state.pinned = True
+        return set()
+    horizon = time.time() - settings.DB_REPLICA_MAX_LAG
+    # A missing version is about to be created as "now", so it is not settled either
+    return {namespace for key, namespace in keys.items() if namespace and values.get(key, horizon + 1) <= horizon}
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        namespace = CATALOG_MODELS.get(model._meta.label)
+        if state is None or state.pinned or namespace is None:
+            return DEFAULT_DB_ALIAS
+        # Inside a transaction reads must see its writes; this also keeps TestCase on one connection
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.settled is None:
+            state.settled = _settled_namespaces(state)
+        return state.replica if namespace in state.settled else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so objects read from either may be related
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas receive the schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
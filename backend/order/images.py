@@ -0,0 +1,124 @@
+import hashlib
+import io
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Longest edge in pixels for each derivative; images are never upscaled
+VARIANT_SIZES = {
+    'thumbnail': 160,
+    'card': 480,
+    'detail': 1200,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+def render_variants(data):
+    """
+    Resizes and re-encodes one source image into every size and format.
+
+    Takes and returns plain bytes so it can run in a worker process:
+    ``{variant: {'width', 'height', 'webp': bytes, 'jpeg': bytes}}``.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    results = {}
+    for variant, edge in VARIANT_SIZES.items():
+        image = source.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        rendered = {'width': image.width, 'height': image.height}
+        for extension, (pil_format, options) in FORMATS.items():
+            frame = image
+            if pil_format == 'JPEG' and frame.mode != 'RGB':
+                frame = _flatten(frame)
+            elif frame.mode not in ('RGB', 'RGBA'):
+                frame = frame.convert('RGBA')
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, **options)
+            rendered[extension] = buffer.getvalue()
+        results[variant] = rendered
+    return results
+
+def _flatten(image):
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+def variant_name(source_name, variant, extension, content):
+    """``products/shirt.jpg`` -> ``products/variants/shirt.card.<hash>.webp``."""
+    directory, filename = posixpath.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return posixpath.join(directory, 'variants', f'{stem}.{variant}.{digest}.{extension}')
+
+def store_variants(field_file, rendered):
+    """Saves rendered derivatives under content-hashed names and returns the ``image_variants`` map."""
+    storage = field_file.storage
+    variants = {'source': field_file.name}
+    for variant, output in rendered.items():
+        entry = {'width': output['width'], 'height': output['height']}
+        for extension in FORMATS:
+            name = variant_name(field_file.name, variant, extension, output[extension])
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(output[extension]))
+            entry[extension] = name
+        variants[variant] = entry
+    return variants
+
+def read_source(field_file):
+    with field_file.storage.open(field_file.name, 'rb') as handle:
+        return handle.read()
+
+def needs_variants(instance):
+    return bool(instance.image) and instance.image_variants.get('source') != instance.image.name
+
+_executor = None
+
+def get_executor():
+    """Process pool shared by a worker; None when IMAGE_VARIANT_WORKERS is 0 (render inline)."""
+    global _executor
+    if settings.IMAGE_VARIANT_WORKERS and _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+    return _executor
+
+def generate_variants(instance):
+    """Renders, stores and records the derivatives for ``instance.image``."""
+    data = read_source(instance.image)
+    executor = get_executor()
+    rendered = executor.submit(render_variants, data).result() if executor else render_variants(data)
+    variants = store_variants(instance.image, rendered)
+    # update() rather than save() so the post_save handlers do not re-queue generation
+    type(instance).objects.filter(pk=instance.pk, image=instance.image.name).update(image_variants=variants)
+    instance.image_variants = variants
+    return variants
+
+def variant_urls(field_file, variants, build_url=None):
+    """
+    Serializer representation of ``image_variants``: per-size URLs plus a
+    ready-made ``srcset`` string per format. Empty until generation runs.
+    """
+    if not field_file or variants.get('source') != field_file.name:
+        return {}
+    storage = field_file.storage
+    build_url = build_url or (lambda url: url)
+    result, srcset, widths = {}, {extension: [] for extension in FORMATS}, set()
+    for variant in VARIANT_SIZES:
+        entry = variants.get(variant)
+        if not entry:
+            continue
+        urls = {extension: build_url(storage.url(entry[extension])) for extension in FORMATS}
+        result[variant] = {**urls, 'width': entry['width'], 'height': entry['height']}
+        # Small sources produce identical sizes; list each width once
+        if entry['width'] not in widths:
+            widths.add(entry['width'])
+            for extension, url in urls.items():
+                srcset[extension].append(f"{url} {entry['width']}w")
+    result['srcset'] = {extension: ', '.join(items) for extension, items in srcset.items()}
+    return result
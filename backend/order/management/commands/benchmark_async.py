@@ -0,0 +1,57 @@
+import json
+from urllib.parse import quote
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from order.benchmarks import run_asgi, run_wsgi
+from order.models import Customer
+
+class Command(BaseCommand):
+    help = (
+        "Compares the sync DRF views (WSGI handler, thread pool) with their /api/async/ "
+        "counterparts (ASGI handler, event loop) on the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and mode.")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--query', default='shirt', help="Search term; its first two letters drive suggestions.")
+        parser.add_argument('--user', help="Username whose favorites are benchmarked (skipped if omitted).")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        headers = {}
+        query = quote(options['query'])
+        endpoints = [
+            ('products', '/api/products/', '/api/async/products/'),
+            ('discounted', '/api/discounted-products/', '/api/async/discounted-products/'),
+            ('search', f'/api/search/?query={query}', f'/api/async/search/?query={query}'),
+            ('suggestions', f'/api/suggestions/?query={query[:2]}', f'/api/async/suggestions/?query={query[:2]}'),
+        ]
+        if options['user']:
+            try:
+                user = Customer.objects.get(username=options['user'])
+            except Customer.DoesNotExist:
+                raise CommandError(f"No customer named {options['user']}")
+            headers['Authorization'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+            endpoints.append(('favorites', '/api/favorites/', '/api/async/favorites/'))
+
+        results = []
+        # The test clients always send Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, sync_path, async_path in endpoints:
+                for mode, runner, path in (('wsgi', run_wsgi, sync_path), ('asgi', run_asgi, async_path)):
+                    runner(path, min(options['concurrency'], options['requests']), options['concurrency'], headers)  # warm-up
+                    stats = runner(path, options['requests'], options['concurrency'], headers)
+                    results.append({'endpoint': name, 'mode': mode, **stats})
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'endpoint':<12} {'mode':<5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for row in results:
+            self.stdout.write(
+                f"{row['endpoint']:<12} {row['mode']:<5} {row['rps']:>9.1f} {row['p50_ms']:>8.2f} "
+                f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['errors']:>7}"
+            )
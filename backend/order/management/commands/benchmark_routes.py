@@ -0,0 +1,134 @@
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import URLPattern, URLResolver
+from rest_framework_simplejwt.tokens import RefreshToken
+from order import urls
+from order.benchmarks import BENCHMARK_PREFIX, build_routes, find_regressions, run_wsgi
+from order.models import Category, CoverImages, Customer, Product, Task
+from order.tasks import record_stripe_event_task, send_mail_task
+from order.utils.mpesa_utils import MpesaCallbackBuffer
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests every route in order/urls.py with concurrent clients against data from "
+        "seed_benchmark_data, reports p50/p95/p99 and throughput, and fails on regressions "
+        "against a baseline. Writes real rows, so use a disposable database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route.")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--routes', nargs='+', metavar='NAME', help="URL names to run (default: all).")
+        parser.add_argument('--include-external', action='store_true',
+                            help="Also run routes that call third-party APIs (M-Pesa STK push).")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Results JSON from an earlier run to compare against.")
+        parser.add_argument('--threshold', type=float, default=settings.BENCHMARK_REGRESSION_THRESHOLD,
+                            help="Allowed relative p95 increase or throughput drop before failing.")
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help="Ignore p95 increases smaller than this.")
+
+    def handle(self, *args, **options):
+        run = int(time.time())
+        customers = list(
+            Customer.objects.filter(username__startswith=BENCHMARK_PREFIX, is_active=True)
+            .exclude(username__startswith=f'{BENCHMARK_PREFIX}new-').order_by('pk')[:max(options['concurrency'], 50)]
+        )
+        products = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:1000])
+        if not customers or not products:
+            raise CommandError("No benchmark data; run seed_benchmark_data first")
+        tokens = [f'Bearer {RefreshToken.for_user(customer).access_token}' for customer in customers]
+        fixtures = {
+            'run': run,
+            'products': products,
+            'categories': sorted(set(Category.objects.values_list('name', flat=True))),
+            'images': list(CoverImages.objects.values_list('pk', flat=True)[:100]),
+            'customers': [{'id': c.pk, 'username': c.username, 'email': c.email} for c in customers],
+        }
+
+        routes = build_routes(fixtures)
+        if options['routes']:
+            unknown = set(options['routes']) - {route.name for route in routes}
+            if unknown:
+                raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+            routes = [route for route in routes if route.name in options['routes']]
+        skipped = [route.name for route in routes if route.external and not options['include_external']]
+        routes = [route for route in routes if route.name not in skipped]
+        uncovered = sorted(set(route_names(urls.urlpatterns)) - {route.name for route in build_routes(fixtures)})
+        if uncovered:
+            self.stderr.write(f"Not benchmarked (no scenario or no rows to use): {', '.join(uncovered)}")
+        if skipped:
+            self.stderr.write(f"Skipped external routes: {', '.join(skipped)} (use --include-external)")
+
+        last_task = Task.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        queue = f'benchmark:mpesa:callbacks:{run}'
+        results = []
+        with override_settings(
+            # The test client sends Host: testserver
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            PAYMENT_GATEWAY='order.payments.FakeGateway',
+            STRIPE_WEBHOOK_SECRET='whsec_benchmark',
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            TASKS_ALWAYS_EAGER=False,
+            MPESA_CALLBACK_QUEUE=queue,
+        ):
+            try:
+                for route in routes:
+                    results.append(self.run_route(route, tokens, options))
+            finally:
+                MpesaCallbackBuffer(key=queue).client.delete(queue)
+                # Mail and webhook tasks queued by the run must not reach a worker
+                Task.objects.filter(
+                    pk__gt=last_task, name__in=[send_mail_task.task_name, record_stripe_event_task.task_name],
+                ).delete()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump({
+                    'created': run,
+                    'requests': options['requests'],
+                    'concurrency': options['concurrency'],
+                    'database': settings.DATABASES['default']['ENGINE'],
+                    'results': results,
+                }, handle, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)['results']
+            regressions = find_regressions(results, baseline, options['threshold'], options['min_delta_ms'])
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions beyond {options['threshold']:.0%} of {options['baseline']}"))
+
+    def run_route(self, route, tokens, options):
+        def headers(i):
+            extra = route.headers(i) if route.headers else {}
+            if route.auth:
+                extra['Authorization'] = tokens[i % len(tokens)]
+            return extra
+
+        requests, concurrency = options['requests'], options['concurrency']
+        if route.method == 'get':
+            # Warm caches and connections; writes are not repeated
+            run_wsgi(route.path, min(concurrency, requests), concurrency, headers)
+        stats = run_wsgi(route.path, requests, concurrency, headers, route.method, route.data)
+        path = route.path(0) if callable(route.path) else route.path
+        return {'route': route.name, 'method': route.method.upper(), 'path': path, **stats}
+
+    def report(self, results):
+        self.stdout.write(f"{'route':<26} {'method':<6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for row in results:
+            self.stdout.write(
+                f"{row['route']:<26} {row['method']:<6} {row['rps']:>9.1f} {row['p50_ms']:>8.2f} "
+                f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['errors']:>7}"
+            )
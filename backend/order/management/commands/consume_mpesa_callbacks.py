@@ -0,0 +1,47 @@
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from order.utils.mpesa_utils import MpesaCallbackBuffer
+
+class Command(BaseCommand):
+    help = "Moves buffered M-Pesa callbacks from Redis into MpesaTransaction in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the buffer once and exit.")
+        parser.add_argument('--stats', action='store_true', help="Print the buffer depth and exit.")
+        parser.add_argument('--batch-size', type=int, default=settings.MPESA_CALLBACK_BATCH_SIZE)
+        parser.add_argument('--consumer', default='default', help="Name of this consumer's processing list.")
+        parser.add_argument('--block', type=int, default=5, help="Seconds to wait for a callback when idle.")
+
+    def handle(self, *args, **options):
+        buffer = MpesaCallbackBuffer(consumer=options['consumer'])
+        if options['stats']:
+            self.stdout.write(f"queued: {buffer.depth()}")
+            self.stdout.write(f"dead-lettered: {buffer.dead_letters()}")
+            return
+        recovered = buffer.recover()
+        if recovered:
+            self.stdout.write(f"Requeued {recovered} in-flight callbacks")
+        if options['once']:
+            total = 0
+            while consumed := buffer.drain(options['batch_size']):
+                total += consumed
+            self.stdout.write(f"Consumed {total} callbacks")
+            return
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.running:
+            try:
+                buffer.drain(options['batch_size'], timeout=options['block'])
+            except Exception as exc:
+                # drain() dead-letters callbacks that fail on their own, so this is a lost connection
+                self.stderr.write(f"Batch failed ({exc}); requeueing it")
+                time.sleep(options['block'])
+                close_old_connections()
+                buffer.recover()
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,26 @@
+import sys
+from django.core.management.base import BaseCommand
+from order.catalog_io import detect_format, export_rows, write_rows
+from order.models import Product
+
+class Command(BaseCommand):
+    help = "Streams every product to a CSV or JSONL file ('-' for stdout) in the format import_catalog reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per round trip.")
+
+    def handle(self, *args, **options):
+        format = detect_format(options['path'], options['format'])
+        stream = sys.stdout if options['path'] == '-' else open(options['path'], 'w', newline='', encoding='utf-8')
+        try:
+            count = write_rows(export_rows(chunk_size=options['chunk_size']), stream, format)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        missing = Product.objects.filter(sku__isnull=True).count()
+        if missing:
+            self.stderr.write(f"{missing} products have no SKU; give them one before re-importing the file.")
+        if stream is not sys.stdout:
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} products to {options['path']}"))
@@ -0,0 +1,53 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from order.images import needs_variants, read_source, render_variants, store_variants
+from order.models import CoverImages, Product
+from order.utils.cache_utils import bump_catalog_version, IMAGES, PRODUCTS
+
+class Command(BaseCommand):
+    help = "Backfills responsive image derivatives for existing product and cover images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_VARIANT_WORKERS,
+                            help="Rendering processes; 0 renders in this process.")
+        parser.add_argument('--force', action='store_true', help="Regenerate even when variants are current.")
+
+    def handle(self, *args, **options):
+        executor = ProcessPoolExecutor(options['workers']) if options['workers'] else None
+        try:
+            for model, namespace in ((Product, PRODUCTS), (CoverImages, IMAGES)):
+                pending = [
+                    instance for instance in model.objects.exclude(image='').exclude(image__isnull=True).only('image', 'image_variants')
+                    if options['force'] or needs_variants(instance)
+                ]
+                done = self.backfill(pending, executor)
+                if done:
+                    bump_catalog_version(namespace)
+                self.stdout.write(f"{model._meta.verbose_name_plural}: generated variants for {done} of {len(pending)}")
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def backfill(self, instances, executor, chunk_size=32):
+        """Renders in chunks so only ``chunk_size`` source images are held in memory at once."""
+        done = 0
+        for start in range(0, len(instances), chunk_size):
+            jobs = []
+            for instance in instances[start:start + chunk_size]:
+                try:
+                    data = read_source(instance.image)
+                except OSError as e:
+                    self.stderr.write(f"Skipping {instance.image.name}: {e}")
+                    continue
+                jobs.append((instance, executor.submit(render_variants, data) if executor else data))
+            for instance, job in jobs:
+                try:
+                    rendered = job.result() if executor else render_variants(job)
+                except Exception as e:
+                    self.stderr.write(f"Skipping {instance.image.name}: {e}")
+                    continue
+                variants = store_variants(instance.image, rendered)
+                # An image replaced since it was read keeps the variants its own upload queued
+                done += type(instance).objects.filter(pk=instance.pk, image=instance.image.name).update(image_variants=variants)
+        return done
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from order.catalog_io import CatalogImporter, detect_format, read_rows
+
+class Command(BaseCommand):
+    help = (
+        "Creates or updates products by SKU from a CSV or JSONL file ('-' for stdin) with the columns "
+        "sku, name, description, price, category, discount_percentage and image. The image column may "
+        "be a URL, a path under --image-root or a name already in media storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--image-workers', type=int, default=8, help="Threads fetching or copying images.")
+        parser.add_argument(
+            '--image-root', default='',
+            help="Directory relative image paths are read from; must be within CATALOG_IMPORT_ROOT, the default.",
+        )
+        parser.add_argument('--strict', action='store_true', help="Exit non-zero if any row was skipped.")
+
+    def handle(self, *args, **options):
+        format = detect_format(options['path'], options['format'])
+        allowed = os.path.realpath(settings.CATALOG_IMPORT_ROOT)
+        image_root = os.path.realpath(options['image_root'] or allowed)
+        if os.path.commonpath([allowed, image_root]) != allowed:
+            raise CommandError(f"--image-root must be within CATALOG_IMPORT_ROOT ({allowed})")
+        importer = CatalogImporter(
+            batch_size=options['batch_size'], image_workers=options['image_workers'], image_root=image_root,
+        )
+        started = time.perf_counter()
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        try:
+            importer.run(read_rows(stream, format), progress=self.progress if options['verbosity'] > 1 else None)
+        except ValueError as exc:
+            # Malformed JSON or a non-object line aborts the import; rows already committed stay
+            raise CommandError(f"Could not read {options['path']}: {exc}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {importer.created} and updated {importer.updated} products "
+            f"in {time.perf_counter() - started:.1f}s; skipped {importer.error_count} rows"
+        ))
+        if importer.images:
+            self.stdout.write("Run generate_image_variants to build responsive images for the imported pictures.")
+        if options['strict'] and importer.error_count:
+            raise CommandError(f"{importer.error_count} rows were skipped")
+
+    def progress(self, importer):
+        self.stdout.write(f"{importer.created + importer.updated} products written, {importer.error_count} skipped")
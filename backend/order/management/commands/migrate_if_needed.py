@@ -0,0 +1,21 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from order.utils.db_utils import unapplied_migrations
+
+class Command(BaseCommand):
+    help = (
+        "Runs migrate only if a migration file on disk is not recorded in django_migrations, "
+        "so container starts against a current schema skip loading and planning the migration graph."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        pending = unapplied_migrations(options['database'])
+        if not pending:
+            self.stdout.write("Schema is current; skipping migrate")
+            return
+        self.stdout.write(f"{len(pending)} migrations not recorded; running migrate")
+        call_command('migrate', database=options['database'], interactive=False, verbosity=options['verbosity'])
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from order.models import Product, Rating
+from order.utils.cache_utils import bump_catalog_version, PRODUCTS
+
+class Command(BaseCommand):
+    help = "Recomputes every product's rating sum, count and average from the Rating table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        aggregates = {
+            row['product_id']: (row['total'], row['count'])
+            for row in Rating.objects.values('product_id').annotate(total=Sum('rating'), count=Count('id'))
+        }
+        batch, updated = [], 0
+        for product in Product.objects.only('pk').iterator(chunk_size=options['batch_size']):
+            total, count = aggregates.get(product.pk, (0, 0))
+            product.rating_sum = total
+            product.rating_count = count
+            product.average_rating = round(total / count, 2) if count else 0
+            batch.append(product)
+            if len(batch) >= options['batch_size']:
+                updated += self.flush(batch)
+        updated += self.flush(batch)
+        bump_catalog_version(PRODUCTS)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed ratings for {updated} products"))
+
+    def flush(self, batch):
+        count = len(batch)
+        Product.objects.bulk_update(batch, ['rating_sum', 'rating_count', 'average_rating'])
+        batch.clear()
+        return count
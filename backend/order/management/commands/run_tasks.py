@@ -0,0 +1,35 @@
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from order import tasks
+
+class Command(BaseCommand):
+    help = "Runs queued background tasks, or reports queue depth with --stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run one batch of due tasks and exit.")
+        parser.add_argument('--stats', action='store_true', help="Print task counts by status and exit.")
+        parser.add_argument('--batch-size', type=int, default=settings.TASKS_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.TASKS_POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for status, count in sorted(tasks.queue_stats().items()):
+                self.stdout.write(f"{status}: {count}")
+            return
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        tasks.requeue_stale()
+        while self.running:
+            ran = tasks.run_pending(options['batch_size'])
+            if options['once']:
+                self.stdout.write(f"Ran {ran} tasks")
+                return
+            if not ran:
+                time.sleep(options['sleep'])
+                tasks.requeue_stale()
+
+    def stop(self, signum, frame):
+        self.running = False
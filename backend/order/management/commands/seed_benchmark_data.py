@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from order.benchmarks import BENCHMARK_PASSWORD, seed_dataset
+
+class Command(BaseCommand):
+    help = (
+        "Adds a reproducible synthetic dataset for benchmark_routes. Customers are "
+        f"named bench-<n> with the password '{BENCHMARK_PASSWORD}'. Use a disposable database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=4)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--carts', type=int, default=100, help="Customers (from the new ones) given a filled cart.")
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--ratings', type=int, default=2000, help="Upper bound; duplicate (product, user) pairs are dropped.")
+        parser.add_argument('--favorites', type=int, default=5, help="Favorite products per customer.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            counts = seed_dataset(
+                categories=options['categories'], products=options['products'], customers=options['customers'],
+                carts=options['carts'], orders=options['orders'], ratings=options['ratings'],
+                favorites=options['favorites'], batch_size=options['batch_size'], seed=options['seed'],
+            )
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,118 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Names produced by order.images.variant_name(), e.g. shirt.card.0123456789ab.webp
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+class RangeFile:
+    """Read-only view of ``length`` bytes from ``start``; it has no fileno(), so the server streams it instead of using sendfile."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+def parse_range(header, size):
+    """Returns (start, end) for a single satisfiable byte range, None to send the whole file, or raises ValueError."""
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+def range_applies(request, etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == mtime
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves MEDIA_ROOT with validators, far-future caching for hashed
+    derivative names, single byte ranges and optional X-Accel-Redirect.
+
+    Whole files go out as a FileResponse so WSGI servers that support
+    wsgi.file_wrapper (gunicorn, uWSGI) use sendfile.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    mtime = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = HttpResponse()
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(mtime)
+    headers['Cache-Control'] = IMMUTABLE if HASHED_NAME.search(path) else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    headers['Accept-Ranges'] = 'bytes'
+    conditional = get_conditional_response(request, etag=etag, last_modified=mtime, response=headers)
+    if conditional is not headers:
+        return conditional
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # The front proxy streams the file (and handles ranges) from its internal location
+        headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path.lstrip('/')
+        headers['Content-Type'] = content_type
+        return headers
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and range_applies(request, etag, mtime):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    file = open(full_path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        response = FileResponse(file, content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for header in ('ETag', 'Last-Modified', 'Cache-Control', 'Accept-Ranges'):
+        response[header] = headers[header]
+    return response
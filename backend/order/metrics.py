@@ -0,0 +1,235 @@
+"""
+Per-request timings aggregated into Prometheus histograms.
+
+The middleware keeps a RequestMetrics for the current request in a context
+variable. Database time is collected by an execute wrapper installed on
+every connection, and cache hits by the catalog cache helpers. Because
+sync_to_async copies the context, queries made from async views are
+counted too.
+
+Each worker aggregates observations in memory. Every METRICS_FLUSH_INTERVAL
+seconds a background thread adds them to one Redis hash in a single
+pipelined round trip, so the /metrics endpoint reports totals across all
+workers and no request ever waits on Redis.
+"""
+import contextvars
+import ipaddress
+import logging
+import threading
+import time
+import redis
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ("Wall time spent in Django per request.", DURATION_BUCKETS),
+    'http_request_db_duration_seconds': ("Time spent executing SQL per request.", DURATION_BUCKETS),
+    'http_request_db_queries': ("SQL queries executed per request.", QUERY_BUCKETS),
+    'http_response_render_duration_seconds': ("Time spent rendering the response body.", DURATION_BUCKETS),
+    'http_response_size_bytes': ("Response body size.", SIZE_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': "Requests by view, method and status code.",
+    'http_cache_hits_total': "Catalog cache hits.",
+    'http_cache_misses_total': "Catalog cache misses.",
+}
+
+class RequestMetrics:
+    __slots__ = ('started', 'db_time', 'queries', 'cache_hits', 'cache_misses', 'render_started', 'render_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_started = None
+        self.render_time = 0.0
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+def end_request(token):
+    _current.reset(token)
+
+def record_cache(hit):
+    """Called by the cache helpers; a no-op outside an instrumented request."""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+def _timed_execute(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+def _labels(**labels):
+    return ','.join(f'{name}="{str(value).replace(chr(34), "")}"' for name, value in labels.items())
+
+class Registry:
+    """
+    Pending observations of one worker, keyed ``metric|labels|le``.
+
+    Histogram buckets are stored non-cumulatively and summed when rendered,
+    so workers can add their counts to the shared hash independently.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self.flusher = None
+        self._client = None
+
+    @property
+    def client(self):
+        # A connection of its own, independent of whichever cache backend is configured
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                settings.METRICS_REDIS_URL,
+                socket_timeout=settings.METRICS_REDIS_TIMEOUT,
+                socket_connect_timeout=settings.METRICS_REDIS_TIMEOUT,
+            )
+        return self._client
+
+    def _add(self, field, amount=1):
+        self.pending[field] = self.pending.get(field, 0) + amount
+
+    def observe(self, name, labels, value):
+        le = next((str(bound) for bound in HISTOGRAMS[name][1] if value <= bound), '+Inf')
+        self._add(f'{name}_bucket|{labels}|{le}')
+        self._add(f'{name}_sum|{labels}|', value)
+        self._add(f'{name}_count|{labels}|')
+
+    def record(self, view, method, status, metrics, size):
+        labels = _labels(view=view)
+        with self.lock:
+            self._add(f'http_requests_total|{_labels(view=view, method=method, status=status)}|')
+            self.observe('http_request_duration_seconds', labels, time.perf_counter() - metrics.started)
+            self.observe('http_request_db_duration_seconds', labels, metrics.db_time)
+            self.observe('http_request_db_queries', labels, metrics.queries)
+            self.observe('http_response_render_duration_seconds', labels, metrics.render_time)
+            if size is not None:
+                self.observe('http_response_size_bytes', labels, size)
+            if metrics.cache_hits:
+                self._add(f'http_cache_hits_total|{labels}|', metrics.cache_hits)
+            if metrics.cache_misses:
+                self._add(f'http_cache_misses_total|{labels}|', metrics.cache_misses)
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush_in_background()
+
+    def flush_in_background(self):
+        """Starts a flush on a daemon thread unless one is still running."""
+        with self.lock:
+            if self.flusher is not None and self.flusher.is_alive():
+                return
+            self.last_flush = time.monotonic()
+            self.flusher = threading.Thread(target=self.flush, name='metrics-flush', daemon=True)
+            self.flusher.start()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for field, amount in pending.items():
+            pipe.hincrbyfloat(settings.METRICS_REDIS_KEY, field, amount)
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning("Could not flush request metrics; keeping them for the next attempt", exc_info=True)
+            with self.lock:
+                for field, amount in pending.items():
+                    self._add(field, amount)
+
+    def collect(self):
+        """Totals from every worker as ``{field: value}``; raises RedisError when Redis is unavailable."""
+        flusher = self.flusher
+        if flusher is not None:
+            # Observations taken by a running flush are not in Redis yet
+            flusher.join()
+        self.flush()
+        return {
+            field.decode(): float(value)
+            for field, value in self.client.hgetall(settings.METRICS_REDIS_KEY).items()
+        }
+
+registry = Registry()
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+def render_metrics(values):
+    """Prometheus text exposition (version 0.0.4) of collected values."""
+    series = {}
+    for field, value in values.items():
+        name, labels, le = field.split('|')
+        series.setdefault(name, {}).setdefault(labels, {})[le] = value
+
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for labels, samples in sorted(series.get(name, {}).items()):
+            lines.append(f'{name}{{{labels}}} {_number(samples[""])}')
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for labels, counts in sorted(series.get(f'{name}_bucket', {}).items()):
+            cumulative = 0
+            for le in [*map(str, buckets), '+Inf']:
+                cumulative += counts.get(le, 0)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {_number(cumulative)}')
+            lines.append(f'{name}_sum{{{labels}}} {_number(series[f"{name}_sum"][labels][""])}')
+            lines.append(f'{name}_count{{{labels}}} {_number(series[f"{name}_count"][labels][""])}')
+    return '\n'.join(lines) + '\n'
+
+def _scrape_allowed(request):
+    if settings.METRICS_TOKEN:
+        return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}')
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+@require_GET
+def metrics_view(request):
+    """
+    Scrape target. Requires ``Authorization: Bearer <METRICS_TOKEN>`` when a
+    token is configured, and a client in METRICS_ALLOWED_NETWORKS otherwise.
+    """
+    if not _scrape_allowed(request):
+        return HttpResponseForbidden()
+    try:
+        values = registry.collect()
+    except redis.RedisError:
+        logger.warning("Could not read request metrics", exc_info=True)
+        return HttpResponse("Metrics store unavailable\n", status=503, content_type='text/plain')
+    return HttpResponse(render_metrics(values), content_type='text/plain; version=0.0.4; charset=utf-8')
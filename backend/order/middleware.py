@@ -0,0 +1,127 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from . import db_router
+from .metrics import end_request, registry, start_request
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, SQL time and count, render time, catalog cache hits
+    and response size per resolved view, and reports them to the client in
+    a Server-Timing header when METRICS_SERVER_TIMING is set. Place it first so the timings cover the other
+    middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = start_request()
+        request._metrics = metrics
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        request._metrics = metrics
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered by the handler after the view returns
+        metrics = request._metrics
+        metrics.render_started = time.perf_counter()
+        response.add_post_render_callback(lambda rendered: self._rendered(metrics))
+        return response
+
+    @staticmethod
+    def _rendered(metrics):
+        metrics.render_time = time.perf_counter() - metrics.render_started
+
+    def finish(self, request, response, metrics):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if response.streaming:
+            size = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        else:
+            size = len(response.content)
+        registry.record(view, request.method, response.status_code, metrics, size)
+
+        if settings.METRICS_SERVER_TIMING:
+            total = (time.perf_counter() - metrics.started) * 1000
+            response['Server-Timing'] = ', '.join([
+                f'app;dur={total:.1f}',
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+                f'render;dur={metrics.render_time * 1000:.1f}',
+                f'cache;desc="hits={metrics.cache_hits} misses={metrics.cache_misses}"',
+            ])
+        return response
+
+class ReplicaPinningMiddleware:
+    """
+    Sets up db_router's per-request state and, when a request wrote to the
+    primary, keeps the client's catalog reads on the primary for
+    DB_REPLICA_MAX_LAG seconds. Not loaded when no replica is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def client(request):
+        return request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = db_router.start_request(self.client(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        client = self.client_to_pin(response, state)
+        if client:
+            db_router.pin_client(client)
+        return response
+
+    async def __acall__(self, request):
+        state, token = db_router.start_request(self.client(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        client = self.client_to_pin(response, state)
+        if client:
+            await db_router.apin_client(client)
+        return response
+
+    @staticmethod
+    def client_to_pin(response, state):
+        if not state.wrote:
+            return None
+        if state.client:
+            return state.client
+        # A new session gives the client its identity only in the response
+        morsel = response.cookies.get(settings.SESSION_COOKIE_NAME)
+        return morsel.value if morsel else None
@@ -0,0 +1,305 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:49
+#
+# Baseline for new databases, replacing 0001-0049. Databases that already
+# applied any of those keep using them; see migrate_if_needed.
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_search_indexes(apps, schema_editor):
+    # From 0040 and 0049; the tables are empty when this migration runs, so there is nothing to backfill
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX order_product_search_vector_gin ON order_product USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX order_product_name_trgm ON order_product USING gin ((UPPER(name::text)) gin_trgm_ops)"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS order_product_name_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS order_product_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('order', '0001_initial'),
+        ('order', '0002_product_added_by_admin'),
+        ('order', '0003_remove_cart_items_remove_cart_user'),
+        ('order', '0004_customer_favorites'),
+        ('order', '0005_auto_20240314_2105'),
+        ('order', '0006_cart_products_cart_user'),
+        ('order', '0007_product_average_rating_rating'),
+        ('order', '0008_product_discount_percentage_product_is_discounted_and_more'),
+        ('order', '0009_customer_products'),
+        ('order', '0010_cart_total_customer_cart'),
+        ('order', '0011_customer_user'),
+        ('order', '0012_remove_cart_total_remove_customer_cart_and_more'),
+        ('order', '0013_alter_customer_groups_and_more'),
+        ('order', '0014_buttonimages_coverimages'),
+        ('order', '0015_alter_rating_rating'),
+        ('order', '0016_alter_category_name'),
+        ('order', '0017_alter_category_name'),
+        ('order', '0018_verificationcode'),
+        ('order', '0019_remove_product_is_discounted'),
+        ('order', '0020_product_discount_price'),
+        ('order', '0021_product_is_discounted'),
+        ('order', '0022_remove_product_is_discounted'),
+        ('order', '0023_remove_product_discount_price'),
+        ('order', '0024_remove_product_added_by_admin'),
+        ('order', '0025_alter_product_discount_percentage'),
+        ('order', '0026_alter_product_discount_percentage'),
+        ('order', '0027_alter_product_discount_percentage'),
+        ('order', '0028_alter_product_discount_percentage'),
+        ('order', '0029_product_added_by_admin'),
+        ('order', '0030_remove_product_added_by_admin'),
+        ('order', '0031_alter_rating_rating'),
+        ('order', '0032_mpesatransaction_delete_buttonimages'),
+        ('order', '0033_mpesatransaction_transaction_id'),
+        ('order', '0034_alter_customer_managers_customer_verification_code'),
+        ('order', '0035_remove_customer_name'),
+        ('order', '0036_alter_customer_username'),
+        ('order', '0037_alter_customer_username'),
+        ('order', '0038_alter_customer_username'),
+        ('order', '0039_delete_verificationcode_and_more'),
+        ('order', '0040_product_search_vector'),
+        ('order', '0041_order_total'),
+        ('order', '0042_cartitem_unique_cart_product'),
+        ('order', '0043_rating_aggregates'),
+        ('order', '0044_task'),
+        ('order', '0045_mpesa_callback_matching'),
+        ('order', '0046_stripepayment'),
+        ('order', '0047_image_variants'),
+        ('order', '0048_product_sku'),
+        ('order', '0049_hot_query_indexes'),
+    ]
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('suits', 'Suits'), ('shirts', 'Shirts'), ('neckwear', 'Neckwear & Accessories'), ('shoes', 'Shoes')], max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CoverImages',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('image', models.ImageField(upload_to='images/')),
+                ('image_variants', models.JSONField(blank=True, default=dict, editable=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('username', models.CharField(max_length=150, unique=True, verbose_name='Name')),
+                ('email', models.EmailField(max_length=254, unique=True, verbose_name='Email address')),
+                ('location', models.CharField(blank=True, max_length=255, verbose_name='Location')),
+                ('city', models.CharField(blank=True, max_length=100, verbose_name='City')),
+                ('country', models.CharField(blank=True, max_length=100, verbose_name='Country')),
+                ('payment_method', models.CharField(choices=[('visa', 'Visa'), ('mpesa', 'M-Pesa'), ('paypal', 'PayPal')], max_length=20, verbose_name='Payment Method')),
+                ('groups', models.ManyToManyField(blank=True, to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_ordered', models.BooleanField(default=False)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku', models.CharField(blank=True, help_text='Stock keeping unit; the key used by import_catalog', max_length=64, null=True, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='products/')),
+                ('image_variants', models.JSONField(blank=True, default=dict, editable=False)),
+                ('average_rating', models.DecimalField(decimal_places=2, default=0.0, max_digits=3)),
+                ('rating_sum', models.PositiveIntegerField(default=0, editable=False)),
+                ('rating_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('discount_percentage', models.PositiveIntegerField(default=0, help_text='Percentage of the discount')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='order.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='order.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='order.product')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='products',
+            field=models.ManyToManyField(through='order.OrderItem', to='order.product'),
+        ),
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='order.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='order.product')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='products',
+            field=models.ManyToManyField(through='order.CartItem', to='order.product'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='favorites',
+            field=models.ManyToManyField(blank=True, related_name='favorited_by', to='order.product'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='products',
+            field=models.ManyToManyField(related_name='customers', to='order.product'),
+        ),
+        migrations.CreateModel(
+            name='Rating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.PositiveIntegerField(choices=[(1, 1), (2, 2), (3, 3), (4, 4)])),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='order.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StripePayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255, unique=True)),
+                ('intent_id', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('client_secret', models.CharField(blank=True, max_length=255)),
+                ('amount', models.PositiveIntegerField()),
+                ('currency', models.CharField(max_length=3)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('requires_payment_method', 'Requires payment method'), ('requires_confirmation', 'Requires confirmation'), ('requires_action', 'Requires action'), ('processing', 'Processing'), ('succeeded', 'Succeeded'), ('payment_failed', 'Payment failed'), ('canceled', 'Canceled')], default='requires_payment_method', max_length=30)),
+                ('last_event_id', models.CharField(blank=True, max_length=255)),
+                ('last_event_created', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('args', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('kwargs', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('progress', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MpesaTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=15)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('reference', models.CharField(max_length=100)),
+                ('description', models.CharField(max_length=255)),
+                ('transaction_id', models.CharField(default=uuid.uuid4, max_length=100, unique=True)),
+                ('checkout_request_id', models.CharField(blank=True, max_length=100, null=True, unique=True)),
+                ('status', models.CharField(max_length=50)),
+                ('result_code', models.IntegerField(blank=True, null=True)),
+                ('result_desc', models.CharField(blank=True, max_length=255)),
+                ('transaction_date', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-transaction_date'], name='mpesa_status_date_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('discount_percentage__gt', 0)), fields=['id'], name='product_discounted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('product', 'user'), name='unique_product_rating_per_user'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:11
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+CATEGORY_LABELS = {
+    'suits': 'Suits',
+    'shirts': 'Shirts',
+    'neckwear': 'Neckwear & Accessories',
+    'shoes': 'Shoes',
+}
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    labels = ' '.join(f"WHEN '{name}' THEN '{name} {label}'" for name, label in CATEGORY_LABELS.items())
+    schema_editor.execute(
+        "CREATE INDEX order_product_search_vector_gin ON order_product USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "UPDATE order_product p SET search_vector = "
+        "setweight(to_tsvector('english', p.name), 'A') || "
+        "setweight(to_tsvector('english', p.description), 'B') || "
+        f"setweight(to_tsvector('english', CASE c.name {labels} ELSE c.name END), 'C') "
+        "FROM order_category c WHERE c.id = p.category_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS order_product_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0039_delete_verificationcode_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:13
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    totals = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(total=Sum('subtotal')).values('total')
+    Order.objects.update(total=Coalesce(Subquery(totals), Value(0), output_field=models.DecimalField(max_digits=12, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0040_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:17
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def drop_duplicate_ratings(apps, schema_editor):
+    Rating = apps.get_model('order', 'Rating')
+    duplicates = Rating.objects.values('product_id', 'user_id').annotate(lines=Count('id'), latest=Max('id')).filter(lines__gt=1)
+    for duplicate in duplicates:
+        Rating.objects.filter(product_id=duplicate['product_id'], user_id=duplicate['user_id']).exclude(pk=duplicate['latest']).delete()
+
+
+def backfill_aggregates(apps, schema_editor):
+    Product = apps.get_model('order', 'Product')
+    Rating = apps.get_model('order', 'Rating')
+    for row in Rating.objects.values('product_id').annotate(total=Sum('rating'), count=Count('id')):
+        Product.objects.filter(pk=row['product_id']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            average_rating=round(row['total'] / row['count'], 2),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0042_cartitem_unique_cart_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(drop_duplicate_ratings, migrations.RunPython.noop),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('product', 'user'), name='unique_product_rating_per_user'),
+        ),
+    ]
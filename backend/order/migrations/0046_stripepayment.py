@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0045_mpesa_callback_matching'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255, unique=True)),
+                ('intent_id', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('client_secret', models.CharField(blank=True, max_length=255)),
+                ('amount', models.PositiveIntegerField()),
+                ('currency', models.CharField(max_length=3)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('requires_payment_method', 'Requires payment method'), ('requires_confirmation', 'Requires confirmation'), ('requires_action', 'Requires action'), ('processing', 'Processing'), ('succeeded', 'Succeeded'), ('payment_failed', 'Payment failed'), ('canceled', 'Canceled')], default='requires_payment_method', max_length=30)),
+                ('last_event_id', models.CharField(blank=True, max_length=255)),
+                ('last_event_created', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0047_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, help_text='Stock keeping unit; the key used by import_catalog', max_length=64, null=True, unique=True),
+        ),
+    ]
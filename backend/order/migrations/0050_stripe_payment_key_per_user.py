@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0049_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stripepayment',
+            name='idempotency_key',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name='stripepayment',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_payment_key_per_user'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.7 on 2026-10-18 11:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Folds every user's newer carts into their oldest one, adding up shared lines."""
+    Cart = apps.get_model('order', 'Cart')
+    CartItem = apps.get_model('order', 'CartItem')
+    duplicated = Cart.objects.values('user').annotate(count=models.Count('pk')).filter(count__gt=1).values_list('user', flat=True)
+    for user_id in duplicated:
+        keep, *others = Cart.objects.filter(user_id=user_id).order_by('pk')
+        lines = {item.product_id: item for item in CartItem.objects.filter(cart=keep)}
+        for item in CartItem.objects.filter(cart__in=others).order_by('pk'):
+            line = lines.get(item.product_id)
+            if line is None:
+                item.cart = keep
+                item.save(update_fields=['cart'])
+                lines[item.product_id] = item
+            else:
+                line.quantity += item.quantity
+                line.subtotal += item.subtotal
+                line.save(update_fields=['quantity', 'subtotal'])
+        Cart.objects.filter(pk__in=[cart.pk for cart in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0050_stripe_payment_key_per_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='carts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_cart_user'),
+        ),
+    ]
@@ -1,15 +1,26 @@
+import hashlib
+import logging
 import uuid
+from decimal import Decimal
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models, transaction
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django_filters import rest_framework as filters
 import requests
 from requests.auth import HTTPBasicAuth
 import datetime
 import base64
 from django.conf import settings
+from .cart_backends import get_cart_backend
+from .utils.db_utils import QueryCounter
+
+logger = logging.getLogger(__name__)
 
 class CustomerManager(BaseUserManager):
     def create_user(self, username, email, password=None, **extra_fields):
@@ -66,17 +77,7 @@ class Customer(AbstractUser):
 
     def add_to_cart(self, product, quantity=1):
         try:
-            cart, created = Cart.objects.get_or_create(user=self)
-            cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-            if created:
-                cart_item.quantity = quantity
-            else:
-                cart_item.quantity += quantity
-            cart_item.subtotal = cart_item.quantity * product.price
-            cart_item.save()
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
+            get_cart_backend().add_for_user(self, product, quantity)
         except ObjectDoesNotExist:
             raise ValueError("The product does not exist.")
         
@@ -100,14 +101,42 @@ class Category(models.Model):
     def __str__(self):
         return self.get_name_display()
     
+class ProductQuerySet(models.QuerySet):
+    def with_final_price(self):
+        """Annotates the discounted price so it can be filtered and ordered in SQL."""
+        price = models.DecimalField(max_digits=10, decimal_places=2)
+        hundred = Value(Decimal('100'), output_field=price)
+        # Rounding to whole cents first keeps SQLite from dividing integers
+        cents = Round(F('price') * (hundred - F('discount_percentage')), output_field=price)
+        return self.annotate(final_price=Round(cents / hundred, 2, output_field=price))
+
+    def for_listing(self):
+        return self.select_related('category').with_final_price()
+
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="Stock keeping unit; the key used by import_catalog")
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    # Indexed by product_category_id_idx below
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, db_index=False)
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
     discount_percentage = models.PositiveIntegerField(default=0, help_text="Percentage of the discount")
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pages of DiscountedProductListAPIView walk this instead of the whole table
+            models.Index(fields=['id'], condition=models.Q(discount_percentage__gt=0), name='product_discounted_idx'),
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ]
+        # The trigram index on UPPER(name) is PostgreSQL-only; see migration 0049
     
     def apply_discount(self):
         if self.discount_percentage > 0:
@@ -136,6 +165,20 @@ class Product(models.Model):
             average_rating=average_rating,
             discount_percentage=discount_percentage
         )
+    @classmethod
+    def apply_rating_delta(cls, product_id, sum_delta, count_delta):
+        """Adjusts the running rating aggregate with a single atomic UPDATE."""
+        new_sum = F('rating_sum') + sum_delta
+        new_count = F('rating_count') + count_delta
+        cls.objects.filter(pk=product_id).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            average_rating=Case(
+                When(rating_count__gt=-count_delta, then=Cast(new_sum, models.FloatField()) / new_count),
+                default=Value(0.0),
+            ),
+        )
+
     def is_favorited_by(self, user):
         return self.favorited_by.filter(id=user.id).exists()
     
@@ -143,23 +186,44 @@ class Product(models.Model):
         highest_discount_product = Product.objects.filter(discount_percentage__gt=0).order_by('-discount_percentage').first()
         return highest_discount_product
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotates each order with the sum of its item subtotals in a single query."""
+        return self.annotate(items_total=Coalesce(
+            Sum('orderitem__subtotal'), Value(0),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ))
+
 class Order(models.Model):
-    user = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
+    # Indexed by order_user_created_idx below
+    user = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders', db_index=False)
     products = models.ManyToManyField(Product, through='OrderItem')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_ordered = models.BooleanField(default=False)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
     
+    def calculate_total(self):
+        total = self.orderitem_set.aggregate(total=Sum('subtotal'))['total']
+        return total or 0
+
     def get_total(self):
-        total = 0
-        items = self.orderitem_set.all() 
-        for item in items:
-            if item.product.is_discounted:
-                discount = (item.product.price * item.product.discount_percentage) / 100
-                total += (item.product.price - discount) * item.quantity
-            else:
-                total += item.product.price * item.quantity
-        return total
+        """Placed orders keep the total stored at checkout; open ones are summed on demand."""
+        if self.is_ordered:
+            return self.total
+        return self.calculate_total()
+
+    def place(self, total=None):
+        self.total = self.calculate_total() if total is None else total
+        self.is_ordered = True
+        self.save(update_fields=['total', 'is_ordered', 'updated_at'])
     
     def __str__(self):
         return f"Order #{self.pk}"
@@ -178,42 +242,162 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"Order Item #{self.pk} for {self.order}"
     
+class CartQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """Returns the user's cart, creating it when there is none."""
+        return self.get_or_create(user=user)[0]
+
 class Cart(models.Model):
-    user = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='carts')
+    # The unique constraint's index serves lookups by user
+    user = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='carts', db_index=False)
     products = models.ManyToManyField(Product, through='CartItem')
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='unique_cart_user'),
+        ]
     
     def __str__(self):
         return f"{self.user.username}'s Cart"
     
-    @transaction.atomic
     def add_product(self, product,quantity=1):
-        cart_item, created = CartItem.objects.get_or_create(cart=self, product=product)
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        else:
-            cart_item.quantity = quantity
-            cart_item.subtotal = product.price * quantity
-            cart_item.save()
+        get_cart_backend().add(self, product, quantity)
 
-    @transaction.atomic
     def remove_product(self, product):
-        CartItem.objects.filter(cart=self, product=product).delete()
+        get_cart_backend().remove(self, product)
+
+    def save_items(self):
+        """Writes the backend's cart lines to CartItem rows (a no-op for the database backend)."""
+        get_cart_backend().persist(self)
     
     @transaction.atomic
     def checkout(self):
-        """Transforms all cart items into an order."""
-        order = self.user.create_order()
-        for item in self.cartitem_set.all():
-            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, subtotal=item.subtotal)
-        self.cartitem_set.all().delete()
+        """
+        Transforms all cart items into an order with a constant number of queries.
+
+        The cart row is locked first so concurrent checkouts of the same cart
+        run one after the other. Lines are taken from the cart backend while
+        the lock is held, priced at checkout time, inserted with a single bulk
+        INSERT and removed in one operation. Backends outside the database
+        get the lines back if the checkout fails.
+        """
+        backend = get_cart_backend()
+        with QueryCounter() as counter:
+            Cart.objects.select_for_update().only('pk').get(pk=self.pk)
+            lines = backend.take(self)
+            try:
+                products = Product.objects.in_bulk(list(lines))
+                order = Order.objects.create(user_id=self.user_id)
+                order_items = [
+                    OrderItem(
+                        order=order,
+                        product=products[product_id],
+                        quantity=quantity,
+                        subtotal=(quantity * products[product_id].apply_discount()).quantize(Decimal('0.01')),
+                    )
+                    for product_id, quantity in lines.items() if product_id in products
+                ]
+                OrderItem.objects.bulk_create(order_items)
+                backend.finalize(self, lines)
+                order.place(total=sum(item.subtotal for item in order_items))
+            except BaseException:
+                backend.restore(self, lines)
+                raise
+        self.last_checkout_queries = counter.count
+        logger.debug("Checkout of cart %s ran %d queries", self.pk, counter.count)
+        return order
     
+class CartItemQuerySet(models.QuerySet):
+    UPSERT_VENDORS = ('postgresql', 'sqlite')
+
+    def add_or_increment(self, cart, product, quantity=1):
+        """
+        Adds ``quantity`` of a product to a cart, or increments the existing line,
+        and recomputes the subtotal from the product price.
+
+        On Postgres and SQLite this is a single INSERT ... ON CONFLICT DO UPDATE
+        that reads the price itself; other backends fall back to an F()
+        increment. Raises Product.DoesNotExist when the product is missing.
+        """
+        product_id = getattr(product, 'pk', product)
+        alias = router.db_for_write(self.model)
+        connection = connections[alias]
+        if connection.vendor not in self.UPSERT_VENDORS:
+            return self.using(alias)._increment(cart, product_id, quantity)
+        with connection.cursor() as cursor:
+            cursor.execute(self._upsert_sql(connection, '%s'), [cart.pk, quantity, quantity, product_id])
+            if cursor.rowcount == 0:
+                raise Product.DoesNotExist("Product matching query does not exist.")
+
+    def add_for_user(self, user, product, quantity=1):
+        """
+        add_or_increment for the user's cart, creating the cart in the same
+        round trip: on Postgres one statement whose CTE upserts the cart, on
+        SQLite an INSERT ... ON CONFLICT DO NOTHING sent ahead of the line
+        upsert.
+        """
+        product_id = getattr(product, 'pk', product)
+        alias = router.db_for_write(self.model)
+        connection = connections[alias]
+        if connection.vendor not in self.UPSERT_VENDORS:
+            return self.using(alias)._increment(Cart.objects.db_manager(alias).for_user(user), product_id, quantity)
+        cart_table = connection.ops.quote_name(Cart._meta.db_table)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # DO UPDATE rather than DO NOTHING so RETURNING also yields an existing cart
+                sql = (
+                    f"WITH cart AS (INSERT INTO {cart_table} (user_id) VALUES (%s) "
+                    f"ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id RETURNING id) "
+                ) + self._upsert_sql(connection, '(SELECT id FROM cart)')
+                cursor.execute(sql, [user.pk, quantity, quantity, product_id])
+            else:
+                cursor.execute(f"INSERT INTO {cart_table} (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING", [user.pk])
+                sql = self._upsert_sql(connection, f'(SELECT id FROM {cart_table} WHERE user_id = %s)')
+                cursor.execute(sql, [user.pk, quantity, quantity, product_id])
+            if cursor.rowcount == 0:
+                raise Product.DoesNotExist("Product matching query does not exist.")
+
+    def _upsert_sql(self, connection, cart_id):
+        item_table = connection.ops.quote_name(self.model._meta.db_table)
+        product_table = connection.ops.quote_name(Product._meta.db_table)
+        return (
+            f"INSERT INTO {item_table} (cart_id, product_id, quantity, subtotal) "
+            f"SELECT {cart_id}, id, %s, %s * price FROM {product_table} WHERE id = %s "
+            f"ON CONFLICT (cart_id, product_id) DO UPDATE SET "
+            f"quantity = {item_table}.quantity + EXCLUDED.quantity, "
+            f"subtotal = ({item_table}.quantity + EXCLUDED.quantity) * "
+            f"(SELECT price FROM {product_table} WHERE id = EXCLUDED.product_id)"
+        )
+
+    def _increment(self, cart, product_id, quantity):
+        price = Product.objects.using(self.db).values_list('price', flat=True).get(pk=product_id)
+        values = {
+            'quantity': F('quantity') + quantity,
+            'subtotal': (F('quantity') + quantity) * price,
+        }
+        if self.filter(cart=cart, product_id=product_id).update(**values):
+            return
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(cart=cart, product_id=product_id, quantity=quantity, subtotal=quantity * price)
+        except IntegrityError:
+            self.filter(cart=cart, product_id=product_id).update(**values)
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
     product = models.ForeignKey('Product', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.subtotal: 
             self.subtotal = self.quantity * self.product.price
@@ -227,27 +411,131 @@ class Rating(models.Model):
     user = models.ForeignKey(Customer, on_delete=models.CASCADE)
     rating = models.PositiveIntegerField(choices=[(i, i) for i in range(1, 5)])
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'user'], name='unique_product_rating_per_user'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
     def __str__(self):
         return f"Rating {self.rating} by {self.user.username} for {self.product.name}"
     
 class CoverImages(models.Model):
     title = models.CharField(max_length=255)
     image = models.ImageField(upload_to='images/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
         
 class ProductDiscountFilter(filters.FilterSet):
+  min_price = filters.NumberFilter(field_name='final_price', lookup_expr='gte')
+  max_price = filters.NumberFilter(field_name='final_price', lookup_expr='lte')
+  min_rating = filters.NumberFilter(field_name='average_rating', lookup_expr='gte')
+
   class Meta:
     model = Product
     fields = ['discount_percentage'] 
 
 class MpesaTransaction(models.Model):
+    PENDING = 'Pending'
+    SUCCESS = 'Success'
+    FAILED = 'Failed'
+
+    user = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     phone_number = models.CharField(max_length=15)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     reference = models.CharField(max_length=100)
     description = models.CharField(max_length=255)
     transaction_id = models.CharField(max_length=100, default=uuid.uuid4, unique=True)
+    checkout_request_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     status = models.CharField(max_length=50)
+    result_code = models.IntegerField(null=True, blank=True)
+    result_desc = models.CharField(max_length=255, blank=True)
     transaction_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-transaction_date'], name='mpesa_status_date_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.phone_number} - {self.amount} - {self.user.username} - {self.transaction_id}"
- 
\ No newline at end of file
+        username = self.user.username if self.user_id else 'unknown'
+        return f"{self.phone_number} - {self.amount} - {username} - {self.transaction_id}"
+ 
+class StripePayment(models.Model):
+    """A Stripe PaymentIntent; its final status arrives through the webhook."""
+    STATUS_CHOICES = [
+        ('requires_payment_method', 'Requires payment method'),
+        ('requires_confirmation', 'Requires confirmation'),
+        ('requires_action', 'Requires action'),
+        ('processing', 'Processing'),
+        ('succeeded', 'Succeeded'),
+        ('payment_failed', 'Payment failed'),
+        ('canceled', 'Canceled'),
+    ]
+    user = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
+    idempotency_key = models.CharField(max_length=255)
+    intent_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    client_secret = models.CharField(max_length=255, blank=True)
+    amount = models.PositiveIntegerField()
+    currency = models.CharField(max_length=3)
+    description = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='requires_payment_method')
+    last_event_id = models.CharField(max_length=255, blank=True)
+    last_event_created = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Keys are chosen by clients, so they are only unique per user
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_payment_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.intent_id or self.idempotency_key} - {self.amount} {self.currency} ({self.status})"
+
+    def gateway_idempotency_key(self):
+        """The key sent to Stripe, which would otherwise replay another user's intent for the same key."""
+        return hashlib.sha256(f'{self.user_id}:{self.idempotency_key}'.encode()).hexdigest()
+
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    progress = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
+
+    def set_progress(self, **progress):
+        """Saves progress; also refreshes started_at so long runs are not requeued as stale."""
+        self.progress = progress
+        self.started_at = timezone.now()
+        Task.objects.filter(pk=self.pk).update(progress=progress, started_at=self.started_at)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
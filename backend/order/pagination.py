@@ -0,0 +1,135 @@
+import base64
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on (sort keys, pk).
+
+    The sort keys come from the view's OrderingFilter (or ``view.ordering``),
+    each in its own direction, and every page is fetched with a lexicographic
+    ``WHERE (keys, pk) > (last keys, last pk)`` predicate, so deep pages cost
+    the same as the first one. Sort keys must compare exactly after a JSON
+    round trip, so float annotations should be cast to a decimal first.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_results(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset, request, view=None):
+        """The ordered, cursor-filtered slice for one page (plus one row to detect a next page)."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        values = self.decode_cursor(request)
+        if hasattr(queryset, 'keyset_page'):
+            # Results ranked outside the database pick their own page
+            return queryset.keyset_page(self.ordering, values, self.page_size + 1)
+        queryset = queryset.order_by(*self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after(values))
+        return queryset[:self.page_size + 1]
+
+    def after(self, values):
+        """Rows sorting after ``values``: the first differing key decides, in that key's direction."""
+        predicate = Q()
+        equal = {}
+        for key, value in zip(self.ordering, values):
+            field = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            predicate |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return predicate
+
+    def paginate_results(self, results):
+        """Trims the look-ahead row and sets the next cursor; async callers fetch page_queryset() themselves."""
+        page = results[:self.page_size]
+        self.next_cursor = None
+        if len(results) > self.page_size:
+            last = page[-1]
+            self.next_cursor = self.encode_cursor([self.get_value(last, key.lstrip('-')) for key in self.ordering])
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view):
+        """The requested sort keys with pk appended as a tiebreak, in the first key's direction."""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, filters.OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    break
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or ['pk']
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        keys = [key.lstrip('-') for key in ordering]
+        for unique in ('pk', 'id'):
+            if unique in keys:
+                # Keys after a unique one never decide the order
+                return list(ordering[:keys.index(unique) + 1])
+        return [*ordering, '-pk' if ordering[0].startswith('-') else 'pk']
+
+    def get_value(self, obj, field):
+        value = obj
+        for attr in field.split('__'):
+            value = getattr(value, attr)
+        return value
+
+    def encode_cursor(self, values):
+        payload = json.dumps([self.ordering, values], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            ordering, values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering != self.ordering or not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
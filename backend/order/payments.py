@@ -0,0 +1,90 @@
+import hashlib
+import hmac
+import json
+import logging
+import time
+import stripe
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+def get_payment_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+def stripe_error(exc):
+    """
+    Returns the message and HTTP status for a failed Stripe call: 400 for
+    problems with the payment itself, 502/503 when Stripe could not answer.
+    """
+    if isinstance(exc, (stripe.error.CardError, stripe.error.InvalidRequestError)):
+        return str(exc), 400
+    logger.warning("Stripe request failed: %s", exc)
+    if isinstance(exc, stripe.error.APIConnectionError):
+        return 'Stripe could not be reached', 502
+    if isinstance(exc, (stripe.error.APIError, stripe.error.RateLimitError)):
+        return 'Stripe is temporarily unavailable', 503
+    return 'The payment could not be processed', 502
+
+class StripeGateway:
+    """Creates PaymentIntents on Stripe and verifies its webhook signatures."""
+
+    def create_intent(self, amount, currency, description, idempotency_key, metadata=None):
+        intent = stripe.PaymentIntent.create(
+            api_key=settings.STRIPE_SECRET_KEY,
+            amount=amount,
+            currency=currency,
+            description=description,
+            metadata=metadata or {},
+            automatic_payment_methods={'enabled': True},
+            idempotency_key=idempotency_key,
+        )
+        return {'id': intent.id, 'client_secret': intent.client_secret, 'status': intent.status}
+
+    def parse_webhook(self, payload, signature):
+        """Returns the event as a dict; raises ValueError for a bad signature or body."""
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            raise ValueError("STRIPE_WEBHOOK_SECRET is not configured")
+        try:
+            stripe.WebhookSignature.verify_header(
+                payload.decode('utf-8'), signature, settings.STRIPE_WEBHOOK_SECRET,
+                tolerance=settings.STRIPE_WEBHOOK_TOLERANCE,
+            )
+        except stripe.error.SignatureVerificationError as e:
+            raise ValueError(str(e))
+        return json.loads(payload)
+
+class FakeGateway(StripeGateway):
+    """
+    Network-free stand-in for load tests and local development.
+
+    Intent ids are derived from the idempotency key, like Stripe replaying a
+    request, and webhooks are verified with the same signature scheme, so
+    ``sign()`` can feed events to the real webhook endpoint.
+    """
+
+    def create_intent(self, amount, currency, description, idempotency_key, metadata=None):
+        digest = hashlib.sha256(idempotency_key.encode()).hexdigest()[:24]
+        return {
+            'id': f'pi_fake_{digest}',
+            'client_secret': f'pi_fake_{digest}_secret_{digest[:8]}',
+            'status': 'requires_payment_method',
+        }
+
+    @staticmethod
+    def sign(payload, secret=None, timestamp=None):
+        """Builds a Stripe-Signature header for ``payload`` (bytes)."""
+        timestamp = int(timestamp or time.time())
+        secret = secret or settings.STRIPE_WEBHOOK_SECRET
+        signature = hmac.new(secret.encode(), f'{timestamp}.'.encode() + payload, hashlib.sha256).hexdigest()
+        return f't={timestamp},v1={signature}'
+
+    @staticmethod
+    def event(intent_id, event_type, event_id=None, created=None):
+        created = int(created or time.time())
+        return {
+            'id': event_id or f'evt_fake_{intent_id}_{event_type}_{created}',
+            'type': event_type,
+            'created': created,
+            'data': {'object': {'id': intent_id, 'object': 'payment_intent'}},
+        }
@@ -0,0 +1,192 @@
+import heapq
+import re
+import threading
+from collections import defaultdict
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, DecimalField, F, FloatField, Q, TextField, Value, When
+from django.db.models.functions import Cast, Upper
+from .models import Category, Product
+from .utils.cache_utils import get_catalog_version, PRODUCTS
+
+SEARCH_CONFIG = 'english'
+TRIGRAM_THRESHOLD = 0.3
+FIELD_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+
+def category_label(category):
+    return f"{category.name} {category.get_name_display()}"
+
+def product_search_vector(product):
+    """
+    The tsvector of one product, from its in-memory values. Assigned to the
+    field before save, it is written by the INSERT or UPDATE itself.
+    """
+    return (
+        SearchVector(Value(product.name), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(product.description), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Value(category_label(product.category)), weight='C', config=SEARCH_CONFIG)
+    )
+
+def refresh_search_vectors(queryset=None):
+    """Rebuilds the stored tsvector, issuing one UPDATE per category."""
+    if connection.vendor != 'postgresql':
+        return
+    queryset = Product.objects.all() if queryset is None else queryset
+    for category in Category.objects.filter(pk__in=queryset.values('category_id')):
+        queryset.filter(category=category).update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+            + SearchVector(Value(category_label(category)), weight='C', config=SEARCH_CONFIG)
+        ))
+
+def tokenize(text):
+    terms = []
+    for word in re.findall(r'\w+', text.lower()):
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def similarity(a, b):
+    left, right = trigrams(a), trigrams(b)
+    return len(left & right) / len(left | right)
+
+class PostgresSearchBackend:
+    """
+    Matches with the ``%`` operator on UPPER(name::text) so the trigram GIN
+    index from migration 0049 can be used; a ``similarity > x`` filter cannot.
+    pg_trgm's default similarity threshold is the same 0.3 as TRIGRAM_THRESHOLD.
+
+    The rank is a float4 in Postgres, which a JSON double in a pagination
+    cursor does not compare equal to, so it is cast to a fixed-scale numeric.
+    """
+    rank_field = DecimalField(max_digits=12, decimal_places=6)
+
+    def search(self, queryset, query):
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.alias(
+            name_upper=Upper(Cast('name', TextField())),
+        ).filter(
+            Q(search_vector=search_query) | Q(name_upper__trigram_similar=query.upper())
+        ).annotate(
+            similarity=TrigramSimilarity('name', query),
+        ).annotate(
+            rank=Cast(SearchRank(F('search_vector'), search_query) + F('similarity'), self.rank_field),
+        )
+
+class RankedResults:
+    """
+    Matches ranked in Python by the fallback backend.
+
+    KeysetPagination calls ``keyset_page()``, which picks the page in Python
+    and fetches only its rows, so the SQL stays the size of one page however
+    many products match. Iterating returns every match in rank order.
+    """
+    ordering = ['-rank', '-pk']
+
+    def __init__(self, queryset, scores):
+        self.queryset = queryset
+        self.scores = scores
+
+    def keyset_page(self, ordering, after, limit):
+        if ordering != self.ordering:
+            raise ValueError(f"Search results can only be ordered by {self.ordering}")
+        ranked = ((score, pk) for pk, score in self.scores.items())
+        if after is not None:
+            last = tuple(after)
+            ranked = (key for key in ranked if key < last)
+        page = heapq.nlargest(limit, ranked) if limit is not None else sorted(ranked, reverse=True)
+        return self.queryset.filter(pk__in=[pk for score, pk in page]).annotate(rank=Case(
+            *[When(pk=pk, then=Value(score)) for score, pk in page],
+            output_field=FloatField(),
+        )).order_by(*self.ordering)
+
+    def __iter__(self):
+        return iter(self.keyset_page(self.ordering, None, None))
+
+class InvertedIndexSearchBackend:
+    """
+    In-process equivalent of the Postgres backend for SQLite: an inverted index
+    over the same weighted fields, with trigram matching for unknown terms.
+    Unknown terms are only compared with the terms sharing a trigram with them.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.postings = {}
+        self.trigram_terms = {}
+
+    def build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        rows = Product.objects.select_related('category').only(
+            'name', 'description', 'category__name'
+        )
+        for product in rows:
+            fields = (
+                (product.name, 'A'),
+                (product.description, 'B'),
+                (category_label(product.category), 'C'),
+            )
+            for text, weight in fields:
+                for term in tokenize(text):
+                    postings[term][product.pk] += FIELD_WEIGHTS[weight]
+        trigram_terms = defaultdict(list)
+        for term in postings:
+            for trigram in trigrams(term):
+                trigram_terms[trigram].append(term)
+        return {term: dict(scores) for term, scores in postings.items()}, dict(trigram_terms)
+
+    def get_postings(self):
+        version = get_catalog_version(PRODUCTS)
+        with self.lock:
+            if version != self.version:
+                self.postings, self.trigram_terms = self.build()
+                self.version = version
+            return self.postings, self.trigram_terms
+
+    def similar_terms(self, term, trigram_terms):
+        own = trigrams(term)
+        shared = defaultdict(int)
+        for trigram in own:
+            for known in trigram_terms.get(trigram, ()):
+                shared[known] += 1
+        return [
+            known for known, count in shared.items()
+            if count / (len(own) + len(trigrams(known)) - count) > TRIGRAM_THRESHOLD
+        ]
+
+    def score(self, query):
+        postings, trigram_terms = self.get_postings()
+        scores = None
+        for term in tokenize(query):
+            candidates = [term] if term in postings else self.similar_terms(term, trigram_terms)
+            term_scores = defaultdict(float)
+            for candidate in candidates:
+                for pk, weight in postings[candidate].items():
+                    term_scores[pk] = max(term_scores[pk], weight)
+            if scores is None:
+                scores = dict(term_scores)
+            else:
+                scores = {pk: scores[pk] + term_scores[pk] for pk in scores.keys() & term_scores.keys()}
+        return scores or {}
+
+    def search(self, queryset, query):
+        return RankedResults(queryset, self.score(query))
+
+_fallback_backend = InvertedIndexSearchBackend()
+
+def get_search_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return _fallback_backend
+
+def search_products(query, queryset=None):
+    """Returns products matching ``query`` annotated with a relevance ``rank``."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    if not query.strip():
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+    return get_search_backend().search(queryset, query)
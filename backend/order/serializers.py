@@ -1,17 +1,31 @@
 from rest_framework import serializers
-from .models import Product, Cart, Order, CoverImages, MpesaTransaction,CartItem,Customer
+from .models import Product, Cart, Order, CoverImages, MpesaTransaction,CartItem,Customer,Rating,StripePayment
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.core.mail import send_mail
 from django.conf import settings
-from .utils.utils import send_verification_email, generate_verification_code
+from .utils.utils import generate_verification_code
+from .images import variant_urls
+from .tasks import send_mail_task, send_verification_email_task
 
-class ProductSerializer(serializers.ModelSerializer):
-    discounted_price = serializers.SerializerMethodField()
+class ImageVariantsMixin(serializers.Serializer):
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        return variant_urls(obj.image, obj.image_variants, request.build_absolute_uri if request else None)
+
+class ProductSerializer(ImageVariantsMixin, serializers.ModelSerializer):
+    # Always the SQL annotation from ProductQuerySet.with_final_price
+    discounted_price = serializers.DecimalField(
+        source='final_price', max_digits=10, decimal_places=2, coerce_to_string=False, read_only=True,
+    )
 
     class Meta:
         model = Product
-        fields = fields = '__all__'
+        fields = (
+            'id', 'name', 'description', 'price', 'category', 'image', 'image_variants',
+            'average_rating', 'rating_count', 'discount_percentage', 'discounted_price',
+        )
         
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -19,8 +33,21 @@ class ProductSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url)
         return None
     
-    def get_discounted_price(self, obj):
-        return obj.apply_discount()
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        return Product.objects.for_listing().get(pk=instance.pk)
+
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        return Product.objects.for_listing().get(pk=instance.pk)
+
+class RatingSerializer(serializers.ModelSerializer):
+    average_rating = serializers.DecimalField(source='product.average_rating', max_digits=3, decimal_places=2, read_only=True)
+    rating_count = serializers.IntegerField(source='product.rating_count', read_only=True)
+
+    class Meta:
+        model = Rating
+        fields = ('rating', 'average_rating', 'rating_count')
 
 class CartSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,21 +57,14 @@ class CartSerializer(serializers.ModelSerializer):
 class FavoriteCountSerializer(serializers.Serializer):
     count = serializers.IntegerField()
         
-class EmailSerializer(serializers.Serializer):
+class SendEmailSerializer(serializers.Serializer):
     to = serializers.EmailField()
     subject = serializers.CharField(max_length=255)
     text = serializers.CharField()
         
 class AddToCartSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
-    quantity = serializers.IntegerField(default=1)
-
-    def validate_product_id(self, value):
-        try:
-            Product.objects.get(id=value)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Product not found")
-        return value
+    quantity = serializers.IntegerField(default=1, min_value=1)
 
 class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -55,16 +75,17 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
+        read_only_fields = ('total', 'is_ordered')
 
-class CoverImagesSerializer(serializers.ModelSerializer):
+class CoverImagesSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     class Meta:
         model = CoverImages
-        fields = ('id', 'title', 'image')
+        fields = ('id', 'title', 'image', 'image_variants')
         
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
-        fields = ['username', 'email', 'password', 'name', 'location', 'city', 'country']
+        fields = ['username', 'email', 'password', 'location', 'city', 'country']
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
@@ -73,21 +94,18 @@ class CustomerSerializer(serializers.ModelSerializer):
             username=validated_data['username'],
             email=validated_data['email'],
             password=validated_data['password'],
-            name=validated_data.get('name', ''),
             location=validated_data.get('location', ''),
             city=validated_data.get('city', ''),
             country=validated_data.get('country', ''),
-            verification_code=verification_code
         )
-        send_verification_email(validated_data['email'], verification_code)
-        send_mail(
+        send_verification_email_task.delay(validated_data['email'], verification_code)
+        send_mail_task.delay(
             'Welcome to Modern Man',
             'Your account has been created successfully!',
             settings.EMAIL_HOST_USER,
             [validated_data['email']],
-            fail_silently=False,
         )
-        return Customer
+        return user
         
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
@@ -106,15 +124,21 @@ class VerifyCodeSerializer(serializers.Serializer):
     code = serializers.CharField(max_length=6)
     
 class ChargeSerializer(serializers.Serializer):
-    stripe_token = serializers.CharField(max_length=255)
-    amount = serializers.IntegerField()
+    amount = serializers.IntegerField(min_value=1)
     currency = serializers.CharField(max_length=3, default='usd')
-    description = serializers.CharField(max_length=255, required=False)
+    description = serializers.CharField(max_length=255, required=False, default='A Django charge')
+    idempotency_key = serializers.CharField(max_length=255, required=False)
+
+class StripePaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StripePayment
+        fields = ('id', 'intent_id', 'client_secret', 'amount', 'currency', 'description', 'status')
     
 class MpesaTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = MpesaTransaction
         fields = '__all__'
+        read_only_fields = ('user', 'transaction_id', 'checkout_request_id', 'status', 'result_code', 'result_desc')
         
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
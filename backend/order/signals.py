@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db import connections
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import Product, Category, CoverImages, Rating
+from .cart_backends import merge_anonymous_cart
+from .images import needs_variants
+from .search import product_search_vector, refresh_search_vectors
+from .suggestions import suggestion_index
+from .tasks import generate_image_variants_task
+from .utils.cache_utils import bump_catalog_version, PRODUCTS, IMAGES
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_product_catalog(sender, **kwargs):
+    bump_catalog_version(PRODUCTS)
+
+@receiver([post_save, post_delete], sender=CoverImages)
+def invalidate_cover_images(sender, **kwargs):
+    bump_catalog_version(IMAGES)
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=CoverImages)
+def queue_image_variants(sender, instance, **kwargs):
+    if needs_variants(instance):
+        generate_image_variants_task.delay(sender._meta.label, instance.pk)
+
+SEARCHED_FIELDS = {'name', 'description', 'category'}
+
+@receiver(pre_save, sender=Product)
+def set_product_search_vector(sender, instance, using, update_fields, **kwargs):
+    # Written by the save's own INSERT or UPDATE rather than a second statement
+    if update_fields is None and connections[using].vendor == 'postgresql':
+        instance.search_vector = product_search_vector(instance)
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, update_fields, **kwargs):
+    if hasattr(instance.__dict__.get('search_vector'), 'resolve_expression'):
+        # Leave the stored vector to be loaded on access instead of the expression
+        del instance.search_vector
+    elif update_fields is not None and SEARCHED_FIELDS & set(update_fields):
+        refresh_search_vectors(Product.objects.filter(pk=instance.pk))
+
+@receiver(post_save, sender=Category)
+def update_category_search_vectors(sender, instance, **kwargs):
+    refresh_search_vectors(Product.objects.filter(category=instance))
+
+@receiver(post_save, sender=Product)
+def update_suggestion_index(sender, instance, **kwargs):
+    suggestion_index.add(instance)
+
+@receiver(post_delete, sender=Product)
+def remove_from_suggestion_index(sender, instance, **kwargs):
+    suggestion_index.remove(instance.pk)
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        merge_anonymous_cart(request, user)
+
+@receiver(post_save, sender=Rating)
+def add_rating_to_aggregate(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_rating', None)
+    if created:
+        Product.apply_rating_delta(instance.product_id, instance.rating, 1)
+    elif previous is not None and previous != instance.rating:
+        Product.apply_rating_delta(instance.product_id, instance.rating - previous, 0)
+    else:
+        return
+    instance._loaded_rating = instance.rating
+    # Listings only show the average, so a burst of ratings invalidates them once
+    bump_catalog_version(PRODUCTS, delay=settings.CATALOG_RATING_BUMP_DELAY)
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_aggregate(sender, instance, **kwargs):
+    Product.apply_rating_delta(instance.product_id, -instance.rating, -1)
+    bump_catalog_version(PRODUCTS, delay=settings.CATALOG_RATING_BUMP_DELAY)
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.db import transaction
+from .images import variant_urls
+from .models import Product
+from .utils.cache_utils import get_catalog_version, PRODUCTS
+
+logger = logging.getLogger(__name__)
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+def index_keys(name):
+    """The normalized name plus every suffix starting at a word boundary."""
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+def thumbnail_url(product):
+    if not product.image:
+        return None
+    variants = variant_urls(product.image, product.image_variants)
+    return variants['thumbnail']['webp'] if 'thumbnail' in variants else product.image.url
+
+class PrefixIndex:
+    """
+    Sorted array of (key, pk) pairs answering prefix queries with bisect.
+
+    The index lives in each worker process. Saves made in this process are
+    applied incrementally once their transaction commits; changes from other
+    workers are picked up by comparing the catalog version at most every
+    SUGGESTIONS_REFRESH_INTERVAL seconds.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Lets one thread check and rebuild while the others keep reading
+        self.refresh_lock = threading.Lock()
+        self.keys = []
+        self.entries = {}
+        self.version = None
+        self.checked_at = 0
+
+    def build(self):
+        # Read before the rows so a change made during the build triggers another one
+        version = get_catalog_version(PRODUCTS)
+        keys, entries = [], {}
+        for product in Product.objects.only('id', 'name', 'image', 'image_variants').iterator():
+            entries[product.pk] = self.payload(product)
+            keys.extend((key, product.pk) for key in index_keys(product.name))
+        keys.sort()
+        with self.lock:
+            self.keys, self.entries = keys, entries
+            self.version = version
+            self.checked_at = time.monotonic()
+
+    def payload(self, product):
+        return {
+            'id': product.pk,
+            'name': str(product.name),
+            'thumbnail': thumbnail_url(product),
+        }
+
+    def add(self, product):
+        entry = self.payload(product)
+        transaction.on_commit(lambda: self._apply(product.pk, entry))
+
+    def remove(self, pk):
+        transaction.on_commit(lambda: self._apply(pk, None))
+
+    def _apply(self, pk, entry):
+        """
+        Runs after the catalog version bump registered by the same save, so
+        the version recorded here already covers this change and does not
+        send the worker into a rebuild.
+        """
+        with self.lock:
+            if self.version is None:
+                return
+            self._discard(pk)
+            if entry is not None:
+                self.entries[pk] = entry
+                for key in index_keys(entry['name']):
+                    insort(self.keys, (key, pk))
+            self.version = get_catalog_version(PRODUCTS)
+
+    def _discard(self, pk):
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        for key in index_keys(entry['name']):
+            position = bisect_left(self.keys, (key, pk))
+            if position < len(self.keys) and self.keys[position] == (key, pk):
+                del self.keys[position]
+
+    def ensure_fresh(self):
+        if self.version is not None and time.monotonic() - self.checked_at < settings.SUGGESTIONS_REFRESH_INTERVAL:
+            return
+        with self.refresh_lock:
+            if self.version is not None:
+                if time.monotonic() - self.checked_at < settings.SUGGESTIONS_REFRESH_INTERVAL:
+                    return
+                self.checked_at = time.monotonic()
+                if get_catalog_version(PRODUCTS) == self.version:
+                    return
+            self.build()
+
+    def current_version(self):
+        """The catalog version the index reflects, for ETags describing its answers."""
+        self.ensure_fresh()
+        return self.version
+
+    def lookup(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        results, seen = [], set()
+        with self.lock:
+            position = bisect_left(self.keys, (prefix,))
+            while position < len(self.keys) and len(results) < limit:
+                key, pk = self.keys[position]
+                if not key.startswith(prefix):
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append(self.entries[pk])
+                position += 1
+        return results
+
+suggestion_index = PrefixIndex()
+
+def warm_suggestion_index():
+    """Builds the index at worker start; any failure defers the build to the first lookup."""
+    try:
+        suggestion_index.build()
+    except Exception:
+        logger.warning("Could not warm the suggestion index", exc_info=True)
@@ -0,0 +1,181 @@
+import logging
+import traceback
+from datetime import timedelta
+from functools import wraps
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .images import generate_variants, needs_variants
+from .models import Customer, StripePayment, Task
+from .utils.cache_utils import bump_catalog_version, IMAGES, PRODUCTS
+from .utils.email_utils import send_bulk_email
+from .utils.utils import send_verification_email
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+def task(func=None, *, name=None, max_attempts=None, bind=False):
+    """
+    Registers ``func`` as a background task and adds ``func.delay(*args, **kwargs)``.
+
+    With ``bind=True`` the function receives its Task row as the first
+    argument, e.g. to report progress with ``task.set_progress()``.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def delay(*args, **kwargs):
+            return enqueue(task_name, *args, **kwargs)
+
+        func.task_name = task_name
+        func.bind = bind
+        func.max_attempts = max_attempts or settings.TASKS_MAX_ATTEMPTS
+        func.delay = delay
+        registry[task_name] = func
+        return func
+    return decorator(func) if func else decorator
+
+def enqueue(name, *args, **kwargs):
+    func = registry[name]
+    task_row = Task.objects.create(name=name, args=list(args), kwargs=kwargs, max_attempts=func.max_attempts)
+    if settings.TASKS_ALWAYS_EAGER:
+        task_row.status = Task.RUNNING
+        task_row.attempts = 1
+        execute(task_row)
+    return task_row
+
+def retry_delay(attempts):
+    return min(settings.TASKS_RETRY_BACKOFF * 2 ** (attempts - 1), settings.TASKS_RETRY_BACKOFF_MAX)
+
+def requeue_stale():
+    """
+    Puts tasks whose worker died mid-run back on the queue, or marks them
+    failed once they have used up their attempts, so a task that kills its
+    worker is not retried forever.
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(status=Task.RUNNING, started_at__lt=now - timedelta(seconds=settings.TASKS_VISIBILITY_TIMEOUT))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_at=now, last_error="Worker stopped before the task finished",
+    )
+    if failed:
+        logger.error("%d stale tasks failed permanently", failed)
+    return stale.update(status=Task.QUEUED)
+
+@transaction.atomic
+def claim(limit):
+    now = timezone.now()
+    tasks = list(
+        Task.objects.select_for_update(skip_locked=True)
+        .filter(status=Task.QUEUED, run_at__lte=now)
+        .order_by('run_at')[:limit]
+    )
+    for task_row in tasks:
+        task_row.status = Task.RUNNING
+        task_row.attempts += 1
+        task_row.started_at = now
+    Task.objects.bulk_update(tasks, ['status', 'attempts', 'started_at'])
+    return tasks
+
+def execute(task_row):
+    func = registry.get(task_row.name)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task {task_row.name}")
+        args = [task_row, *task_row.args] if func.bind else task_row.args
+        func(*args, **task_row.kwargs)
+    except Exception:
+        task_row.last_error = traceback.format_exc()
+        if task_row.attempts >= task_row.max_attempts:
+            task_row.status = Task.FAILED
+            task_row.finished_at = timezone.now()
+            logger.error("Task %s failed permanently", task_row)
+        else:
+            task_row.status = Task.QUEUED
+            task_row.run_at = timezone.now() + timedelta(seconds=retry_delay(task_row.attempts))
+            logger.warning("Task %s failed, retrying at %s", task_row, task_row.run_at)
+    else:
+        task_row.status = Task.SUCCEEDED
+        task_row.finished_at = timezone.now()
+    task_row.save(update_fields=['status', 'attempts', 'run_at', 'finished_at', 'last_error', 'progress'])
+    return task_row
+
+def run_pending(limit=None):
+    """Claims and runs one batch of due tasks; returns how many ran."""
+    tasks = claim(limit or settings.TASKS_BATCH_SIZE)
+    for task_row in tasks:
+        execute(task_row)
+    return len(tasks)
+
+def queue_stats():
+    counts = dict(Task.objects.values_list('status').annotate(count=Count('id')))
+    counts['due'] = Task.objects.filter(status=Task.QUEUED, run_at__lte=timezone.now()).count()
+    return counts
+
+@task
+def send_verification_email_task(email, code):
+    send_verification_email(email, code)
+
+@task
+def send_mail_task(subject, message, from_email, recipient_list):
+    send_mail(subject, message, from_email, recipient_list, fail_silently=False)
+
+@task(bind=True)
+def send_bulk_email_task(task_row, selection, subject, body):
+    """
+    Runs send_bulk_email for the customers described by ``selection`` (see
+    CustomerAdmin.describe_selection), resuming after the last reported batch.
+    """
+    from django.contrib import admin
+    queryset = admin.site.get_model_admin(Customer).selected_queryset(selection)
+
+    resume = dict(task_row.progress)
+    report_from = resume.get('sent', 0)
+
+    def progress(sent, total, last_pk):
+        task_row.set_progress(
+            sent=report_from + sent,
+            total=resume.get('total', total),
+            last_pk=last_pk,
+        )
+
+    send_bulk_email(queryset, subject, body, start_after=resume.get('last_pk'), progress=progress)
+
+STRIPE_EVENT_STATUSES = {
+    'payment_intent.processing': 'processing',
+    'payment_intent.requires_action': 'requires_action',
+    'payment_intent.succeeded': 'succeeded',
+    'payment_intent.payment_failed': 'payment_failed',
+    'payment_intent.canceled': 'canceled',
+}
+
+@task
+def record_stripe_event_task(event_id, event_type, intent_id, created):
+    """
+    Applies a PaymentIntent webhook event with one conditional UPDATE.
+
+    Redelivered, out-of-order and post-terminal events match no row, so
+    Stripe's at-least-once delivery cannot move a payment backwards.
+    """
+    StripePayment.objects.filter(
+        intent_id=intent_id, last_event_created__lte=created,
+    ).exclude(last_event_id=event_id).exclude(status__in=['succeeded', 'canceled']).update(
+        status=STRIPE_EVENT_STATUSES[event_type],
+        last_event_id=event_id,
+        last_event_created=created,
+        updated_at=timezone.now(),
+    )
+
+@task
+def generate_image_variants_task(model_label, pk):
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_variants(instance):
+        return
+    generate_variants(instance)
+    bump_catalog_version(IMAGES if model_label == 'order.CoverImages' else PRODUCTS)
@@ -0,0 +1,160 @@
+import datetime
+import hashlib
+import time
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from order.metrics import record_cache
+
+PRODUCTS = 'products'
+IMAGES = 'images'
+
+CATALOG_PARAMS = (
+    'category', 'ordering', 'discount_percentage', 'min_price', 'max_price', 'min_rating',
+    'cursor', 'page_size',
+)
+
+def _version_key(namespace):
+    return f'catalog:version:{namespace}'
+
+def _pending_key(namespace):
+    return f'catalog:pending:{namespace}'
+
+def get_catalog_version(namespace):
+    """Returns the timestamp of the last change to the given catalog namespace."""
+    key, pending_key = _version_key(namespace), _pending_key(namespace)
+    values = cache.get_many([key, pending_key])
+    version = values.get(key)
+    due = values.get(pending_key)
+    # Only the reader that removes a due delayed bump applies it
+    if due is not None and due <= time.time() and cache.delete(pending_key):
+        version = time.time()
+        cache.set(key, version, None)
+    elif version is None:
+        version = time.time()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+def bump_catalog_version(namespace, delay=0):
+    """
+    Marks the namespace changed once the current transaction commits, or
+    immediately outside one. Bumping earlier would let a concurrent reader
+    miss under the new version, read the old rows and cache them under it.
+
+    With ``delay``, the change is applied by the first read ``delay`` seconds
+    later, and further delayed bumps before then are folded into it. Frequent
+    small changes then invalidate the cached pages once per ``delay``.
+    """
+    if delay:
+        transaction.on_commit(lambda: cache.add(_pending_key(namespace), time.time() + delay, None))
+    else:
+        transaction.on_commit(lambda: cache.set(_version_key(namespace), time.time(), None))
+
+def catalog_cache_key(namespace, endpoint, request, extra=None):
+    params = {name: request.GET.get(name, '') for name in CATALOG_PARAMS}
+    params.update(extra or {})
+    normalized = '&'.join(f'{name}={params[name]}' for name in sorted(params))
+    digest = hashlib.md5(f'{request.get_host()}?{normalized}'.encode()).hexdigest()
+    return f'catalog:{namespace}:{get_catalog_version(namespace)}:{endpoint}:{digest}'
+
+def get_or_set_catalog(namespace, endpoint, request, compute, extra=None):
+    key = catalog_cache_key(namespace, endpoint, request, extra)
+    data = cache.get(key)
+    record_cache(data is not None)
+    if data is None:
+        data = compute()
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    return data
+
+async def aget_or_set_catalog(namespace, endpoint, request, compute, extra=None):
+    """get_or_set_catalog for async views; ``compute`` is a coroutine function."""
+    key = await sync_to_async(catalog_cache_key)(namespace, endpoint, request, extra)
+    data = await cache.aget(key)
+    record_cache(data is not None)
+    if data is None:
+        data = await compute()
+        await cache.aset(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    return data
+
+def _request_version(request, namespace, version):
+    """Reads the version once per request; condition() asks for the ETag and Last-Modified separately."""
+    versions = request.__dict__.setdefault('_catalog_versions', {})
+    if namespace not in versions:
+        versions[namespace] = version()
+    return versions[namespace]
+
+def _request_format(request, renderers):
+    """The format of the renderer content negotiation will pick for the request, or '' for none."""
+    if '_catalog_format' not in request.__dict__:
+        try:
+            renderer, _ = DefaultContentNegotiation().select_renderer(Request(request), [r() for r in renderers])
+        except NotAcceptable:
+            renderer = None
+        request._catalog_format = renderer.format if renderer else ''
+    return request._catalog_format
+
+def catalog_conditional(namespace, version=None, renderers=None):
+    """
+    View decorator deriving ETag and Last-Modified from the catalog version.
+
+    A client whose copy is current gets a 304 before the view runs, so no
+    query or serializer work happens. Responses are marked ``no-cache`` so
+    browsers always revalidate instead of guessing a freshness lifetime.
+
+    The ETag also names the negotiated format, and responses carry
+    ``Vary: Accept``, so the JSON and the browsable API never validate each
+    other. ``renderers`` lists the view's renderer classes when they differ
+    from DEFAULT_RENDERER_CLASSES.
+
+    ``version`` replaces the catalog version for views answering from data
+    that can lag behind it, so the ETag never claims a newer catalog than
+    the body was built from.
+    """
+    version = version or (lambda: get_catalog_version(namespace))
+    renderers = renderers or api_settings.DEFAULT_RENDERER_CLASSES
+
+    def etag(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return (
+                f'"{namespace}-{_request_version(request, namespace, version):.6f}'
+                f'-{_request_format(request, renderers)}{settings.CATALOG_ETAG_SALT}"'
+            )
+        return None
+
+    def last_modified(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return datetime.datetime.fromtimestamp(_request_version(request, namespace, version), tz=datetime.timezone.utc)
+        return None
+
+    def finish(request, response):
+        # Also applied to 304s, which condition() answers without calling the view
+        if request.method in ('GET', 'HEAD'):
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ['Accept'])
+        return response
+
+    def decorator(view):
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                # condition() calls the validator functions synchronously; read the
+                # version off the event loop first so they only hit the memo
+                if request.method in ('GET', 'HEAD'):
+                    await sync_to_async(_request_version)(request, namespace, version)
+                return finish(request, await conditional(request, *args, **kwargs))
+        else:
+            @wraps(view)
+            def wrapped(request, *args, **kwargs):
+                return finish(request, conditional(request, *args, **kwargs))
+        return wrapped
+    return decorator
@@ -0,0 +1,88 @@
+import json
+import pkgutil
+import time
+from importlib import import_module
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+class QueryCounter:
+    """Counts and times the queries executed on a connection while the block is active."""
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+def explain_plan(queryset, force_indexes=True):
+    """
+    Returns the PostgreSQL JSON plan of ``queryset``. With ``force_indexes``
+    sequential scans are priced out, so one only remains where no usable
+    index exists; test tables are too small for the planner to prefer an
+    index on its own.
+    """
+    connection = connections[queryset.db]
+    with transaction.atomic(using=queryset.db), connection.cursor() as cursor:
+        if force_indexes:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain(format='json')
+    return json.loads(plan)[0]['Plan'] if isinstance(plan, str) else plan[0]['Plan']
+
+def sequential_scans(plan):
+    """Relation names read with a Seq Scan anywhere in a plan from explain_plan."""
+    tables = []
+    if plan.get('Node Type') == 'Seq Scan':
+        tables.append(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        tables.extend(sequential_scans(child))
+    return tables
+
+def migration_files():
+    """
+    ``(app_label, name)`` of every migration file on disk, named the way
+    MigrationLoader names them but without importing the migrations.
+    """
+    files = set()
+    for app_config in apps.get_app_configs():
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            module = import_module(module_name)
+        except ModuleNotFoundError:
+            continue
+        if getattr(module, '__file__', None) is None or not hasattr(module, '__path__'):
+            continue
+        files.update(
+            (app_config.label, name) for _, name, is_pkg in pkgutil.iter_modules(module.__path__)
+            if not is_pkg and name[0] not in '_~'
+        )
+    return files
+
+def unapplied_migrations(using=DEFAULT_DB_ALIAS):
+    """
+    Migration files not recorded in django_migrations: one query instead of
+    building the migration graph. Applying a squashed migration records the
+    migrations it replaces too, so both fresh and upgraded databases end up
+    with every file on disk recorded.
+    """
+    recorder = MigrationRecorder(connections[using])
+    if not recorder.has_table():
+        return migration_files()
+    return migration_files() - set(recorder.applied_migrations())
@@ -1,8 +1,52 @@
 # utils.py
-from django.core.mail import send_mail
+import time
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection, send_mail
 
 def send_email(email):
     subject = 'Special Discount Offer!'
     message = f'Hi there,\n\nWe are pleased to offer you a 20% discount on our products. Don`t miss out!'
     sender = 'your_email@example.com' 
-    send_mail(subject, message, sender, [email])
\ No newline at end of file
+    send_mail(subject, message, sender, [email])
+
+def send_bulk_email(queryset, subject, body, start_after=None, batch_size=None, rate=None, progress=None):
+    """
+    Sends a personalised message to every customer in ``queryset``.
+
+    Recipients are streamed in primary-key order with a server-side cursor.
+    Each batch goes out over a single SMTP connection via ``send_messages``
+    and batches are spaced to stay under ``rate`` messages per second.
+    ``progress(sent, total, last_pk)`` is called after every batch, and
+    ``start_after`` resumes after the last reported primary key.
+    """
+    batch_size = batch_size or settings.BULK_EMAIL_BATCH_SIZE
+    rate = settings.BULK_EMAIL_RATE if rate is None else rate
+    queryset = queryset.order_by('pk')
+    if start_after is not None:
+        queryset = queryset.filter(pk__gt=start_after)
+    total = queryset.count()
+    sent, batch, last_pk = 0, [], start_after
+    recipients = queryset.values_list('pk', 'username', 'email').iterator(chunk_size=batch_size)
+    for pk, username, email in recipients:
+        batch.append(EmailMessage(subject, f"Dear {username},\n\n{body}", to=[email]))
+        last_pk = pk
+        if len(batch) >= batch_size:
+            sent += _send_batch(batch, rate)
+            if progress:
+                progress(sent, total, last_pk)
+            batch = []
+    if batch:
+        sent += _send_batch(batch, rate)
+    if progress:
+        progress(sent, total, last_pk)
+    return sent
+
+def _send_batch(messages, rate):
+    started = time.monotonic()
+    with get_connection() as connection:
+        sent = connection.send_messages(messages) or 0
+    if rate:
+        remaining = len(messages) / rate - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+    return sent
@@ -1,68 +1,348 @@
+import hashlib
+import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
+from django.db import InterfaceError, OperationalError, transaction
 import datetime
 import base64
 import json
+from decimal import Decimal, InvalidOperation
 from django.http import JsonResponse
-from django.contrib.auth.models import User as DjangoUser 
-from order.models import MpesaTransaction, Customer
+from order.models import MpesaTransaction
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_URL = "https://sandbox.safaricom.co.ke"
+PRODUCTION_URL = "https://api.safaricom.co.ke"
+
+class MpesaClient:
+    """
+    Daraja API client that reuses one keep-alive connection pool per process.
+
+    The OAuth access token is cached in the Django cache (shared by all
+    workers) until shortly before it expires, so an STK push normally costs
+    a single upstream request.
+    """
+    token_expiry_margin = 60
+
+    def __init__(self, base_url=None, consumer_key=None, consumer_secret=None, timeout=None, session=None):
+        self.base_url = (base_url or settings.MPESA_BASE_URL
+                         or (PRODUCTION_URL if settings.MPESA_ENV == 'production' else SANDBOX_URL)).rstrip('/')
+        self.consumer_key = consumer_key or settings.MPESA_CONSUMER_KEY
+        self.consumer_secret = consumer_secret or settings.MPESA_CONSUMER_SECRET
+        self.timeout = timeout or settings.MPESA_TIMEOUT
+        self.session = session or self.build_session()
+        self.token_lock = threading.Lock()
+
+    def build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.MPESA_POOL_SIZE,
+            max_retries=Retry(total=2, backoff_factor=0.2, allowed_methods=['GET'], status_forcelist=[502, 503, 504]),
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def token_cache_key(self):
+        digest = hashlib.sha256(f"{self.base_url}:{self.consumer_key}".encode()).hexdigest()[:16]
+        return f'mpesa:access_token:{digest}'
+
+    def get_access_token(self, refresh=False):
+        token = None if refresh else cache.get(self.token_cache_key)
+        if token:
+            return token
+        with self.token_lock:
+            token = None if refresh else cache.get(self.token_cache_key)
+            if token:
+                return token
+            response = self.session.get(
+                f"{self.base_url}/oauth/v1/generate",
+                params={'grant_type': 'client_credentials'},
+                auth=HTTPBasicAuth(self.consumer_key, self.consumer_secret),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            data = response.json()
+            token = data['access_token']
+            expires_in = int(data.get('expires_in', 3599))
+            cache.set(self.token_cache_key, token, max(expires_in - self.token_expiry_margin, 1))
+            return token
+
+    def stk_push_payload(self, phone_number, amount, account_reference, transaction_desc):
+        timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        password = base64.b64encode(f"{settings.MPESA_SHORTCODE}{settings.MPESA_PASSKEY}{timestamp}".encode()).decode('utf-8')
+        return {
+            "BusinessShortCode": settings.MPESA_SHORTCODE,
+            "Password": password,
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            # Daraja only accepts whole shillings; serializers hand us Decimals
+            "Amount": int(amount),
+            "PartyA": phone_number,
+            "PartyB": settings.MPESA_SHORTCODE,
+            "PhoneNumber": phone_number,
+            "CallBackURL": settings.MPESA_CALLBACK_URL,
+            "AccountReference": account_reference,
+            "TransactionDesc": transaction_desc
+        }
+
+    def stk_push(self, phone_number, amount, account_reference, transaction_desc):
+        payload = self.stk_push_payload(phone_number, amount, account_reference, transaction_desc)
+        response = self._post("/mpesa/stkpush/v1/processrequest", payload)
+        if response.status_code == 401:
+            response = self._post("/mpesa/stkpush/v1/processrequest", payload, refresh=True)
+        return response.json()
+
+    def _post(self, path, payload, refresh=False):
+        headers = {'Authorization': f'Bearer {self.get_access_token(refresh=refresh)}'}
+        return self.session.post(f"{self.base_url}{path}", json=payload, headers=headers, timeout=self.timeout)
+
+class AsyncMpesaClient:
+    """
+    asyncio facade over MpesaClient for ASGI views.
+
+    Calls run on asgiref's thread pool so the event loop is never blocked,
+    while still sharing the pooled connections and the cached token. This is
+    not a native async client: each call holds a pool thread for the whole
+    round trip to Daraja, so concurrent STK pushes are bounded by the pool.
+    """
+    def __init__(self, client=None):
+        self.client = client or get_mpesa_client()
+
+    async def get_access_token(self, refresh=False):
+        return await sync_to_async(self.client.get_access_token, thread_sensitive=False)(refresh=refresh)
+
+    async def stk_push(self, phone_number, amount, account_reference, transaction_desc):
+        return await sync_to_async(self.client.stk_push, thread_sensitive=False)(
+            phone_number, amount, account_reference, transaction_desc
+        )
+
+_client = None
+
+def get_mpesa_client():
+    global _client
+    if _client is None:
+        _client = MpesaClient()
+    return _client
 
 def get_mpesa_access_token():
-    consumer_key = settings.MPESA_CONSUMER_KEY
-    consumer_secret = settings.MPESA_CONSUMER_SECRET
-    api_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-    if settings.MPESA_ENV == 'production':
-        api_url = "https://api.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-    response = requests.get(api_url, auth=HTTPBasicAuth(consumer_key, consumer_secret))
-    json_response = response.json()
-    access_token = json_response.get('access_token')
-    return access_token
+    return get_mpesa_client().get_access_token()
 
 def lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_desc):
-    access_token = get_mpesa_access_token()
-    api_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
-    if settings.MPESA_ENV == 'production':
-        api_url = "https://api.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
-    timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-    password = base64.b64encode(f"{settings.MPESA_SHORTCODE}{settings.MPESA_PASSKEY}{timestamp}".encode()).decode('utf-8')
-    payload = {
-        "BusinessShortCode": settings.MPESA_SHORTCODE,
-        "Password": password,
-        "Timestamp": timestamp,
-        "TransactionType": "CustomerPayBillOnline",
-        "Amount": amount,
-        "PartyA": phone_number,
-        "PartyB": settings.MPESA_SHORTCODE,
-        "PhoneNumber": phone_number,
-        "CallBackURL": "https://example.com/callback",
-        "AccountReference": account_reference,
-        "TransactionDesc": transaction_desc
-    }
-    response = requests.post(api_url, json=payload, headers=headers)
-    return response.json()
+    return get_mpesa_client().stk_push(phone_number, amount, account_reference, transaction_desc)
 
-def process_mpesa_callback(request):
-    data = json.loads(request.body.decode('utf-8'))
-    callback_data = data['Body']['stkCallback']
-    
-    phone_number = callback_data['CallbackMetadata']['Item'][4]['Value']
-    amount = callback_data['CallbackMetadata']['Item'][0]['Value']
-    transaction_id = callback_data['CallbackMetadata']['Item'][1]['Value']
-    status = callback_data['ResultDesc']
-    
-    user = Customer.objects.first() 
-
-    MpesaTransaction.objects.create(
-        user=user,
-        phone_number=phone_number,
-        amount=amount,
-        transaction_id=transaction_id,
-        status=status
+def stk_push_error(exc):
+    """Returns the message and HTTP status for an STK push that failed in transport."""
+    logger.warning("M-Pesa STK push failed: %s", exc)
+    if isinstance(exc, requests.Timeout):
+        return 'M-Pesa did not respond in time', 504
+    return 'M-Pesa could not be reached', 502
+
+def record_mpesa_charge(response, data, user=None):
+    """
+    Stores the outcome of an STK push request: a Pending charge keyed by
+    CheckoutRequestID, which the callback consumer settles, or a Failed row.
+    """
+    if response.get('ResponseCode') != '0':
+        return MpesaTransaction.objects.create(
+            **data, user=user, status=MpesaTransaction.FAILED, result_desc=response.get('errorMessage', '')[:255],
+        )
+    charge, created = MpesaTransaction.objects.get_or_create(
+        checkout_request_id=response['CheckoutRequestID'],
+        defaults={**data, 'user': user, 'status': MpesaTransaction.PENDING},
     )
+    if not created:
+        # The callback was consumed before this request finished
+        charge.user = user
+        charge.reference = data.get('reference', '')
+        charge.description = data.get('description', '')
+        charge.save(update_fields=['user', 'reference', 'description'])
+    return charge
 
-    return JsonResponse({"status": "success"})
\ No newline at end of file
+def parse_mpesa_callback(data):
+    """
+    Flattens a Daraja STK callback into the MpesaTransaction columns.
+
+    Metadata items are read by name because Safaricom omits some of them
+    (e.g. Balance) depending on the account. Raises ValueError for payloads
+    that are not STK callbacks, and for successful callbacks without the
+    amount, receipt number or phone number.
+    """
+    try:
+        callback = data['Body']['stkCallback']
+        record = {
+            'checkout_request_id': str(callback['CheckoutRequestID']),
+            'result_code': int(callback['ResultCode']),
+            'result_desc': str(callback.get('ResultDesc', ''))[:255],
+        }
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Not an STK push callback")
+    items = {
+        item.get('Name'): item.get('Value')
+        for item in callback.get('CallbackMetadata', {}).get('Item', [])
+    }
+    record['status'] = MpesaTransaction.SUCCESS if record['result_code'] == 0 else MpesaTransaction.FAILED
+    record['transaction_id'] = items.get('MpesaReceiptNumber')
+    record['amount'] = items.get('Amount')
+    record['phone_number'] = str(items['PhoneNumber']) if 'PhoneNumber' in items else None
+    if record['status'] == MpesaTransaction.SUCCESS:
+        try:
+            record['amount'] = Decimal(str(record['amount']))
+        except InvalidOperation:
+            raise ValueError("Successful STK callback without a valid Amount")
+        if not record['transaction_id'] or not record['phone_number']:
+            raise ValueError("Successful STK callback without MpesaReceiptNumber or PhoneNumber")
+    return record
+
+def ingest_mpesa_callbacks(payloads):
+    """
+    Applies a batch of raw callback payloads in a handful of queries.
+
+    Callbacks are matched to the pending charge saved by MpesaChargeView
+    through CheckoutRequestID. Successful callbacks without a pending charge
+    are upserted on their receipt number, so redelivered callbacks never
+    create duplicate rows. Returns the number of callbacks applied.
+    """
+    records = {}
+    for payload in payloads:
+        try:
+            record = parse_mpesa_callback(payload)
+        except ValueError:
+            logger.warning("Dropping malformed M-Pesa callback: %r", payload)
+            continue
+        records[record['checkout_request_id']] = record
+    if not records:
+        return 0
+
+    with transaction.atomic():
+        pending = MpesaTransaction.objects.select_for_update().filter(checkout_request_id__in=list(records))
+        matched = []
+        for charge in pending:
+            record = records.pop(charge.checkout_request_id)
+            charge.status = record['status']
+            charge.result_code = record['result_code']
+            charge.result_desc = record['result_desc']
+            if record['transaction_id']:
+                charge.transaction_id = record['transaction_id']
+            if record['amount'] is not None:
+                charge.amount = record['amount']
+            matched.append(charge)
+        MpesaTransaction.objects.bulk_update(
+            matched, ['status', 'result_code', 'result_desc', 'transaction_id', 'amount']
+        )
+
+        orphans = [
+            MpesaTransaction(description='', reference='', **record)
+            for record in records.values() if record['transaction_id']
+        ]
+        for checkout_request_id, record in records.items():
+            if not record['transaction_id']:
+                logger.warning("Unmatched failed M-Pesa callback %s: %s", checkout_request_id, record['result_desc'])
+        MpesaTransaction.objects.bulk_create(
+            orphans,
+            update_conflicts=True,
+            unique_fields=['transaction_id'],
+            update_fields=['status', 'result_code', 'result_desc', 'checkout_request_id'],
+        )
+    return len(matched) + len(orphans)
+
+class MpesaCallbackBuffer:
+    """
+    Redis list holding raw callbacks between the webhook and the consumer.
+
+    The webhook only RPUSHes. The consumer LMOVEs payloads onto its own
+    processing list and deletes them once the batch is committed, so a
+    crashed consumer loses nothing: ``recover()`` puts its in-flight
+    payloads back on the queue. Payloads that cannot be applied on their
+    own are moved to a dead-letter list instead of blocking the queue.
+    """
+    def __init__(self, client=None, key=None, consumer='default'):
+        self._client = client
+        self.key = key or settings.MPESA_CALLBACK_QUEUE
+        self.processing_key = f'{self.key}:processing:{consumer}'
+        self.dead_letter_key = f'{self.key}:dead'
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django_redis import get_redis_connection
+            self._client = get_redis_connection('default')
+        return self._client
+
+    def push(self, payload):
+        self.client.rpush(self.key, json.dumps(payload))
+
+    def recover(self):
+        moved = 0
+        while self.client.lmove(self.processing_key, self.key, 'RIGHT', 'LEFT') is not None:
+            moved += 1
+        return moved
+
+    def claim(self, limit, timeout=0):
+        first = self.client.blmove(self.key, self.processing_key, timeout, 'LEFT', 'RIGHT') if timeout else \
+            self.client.lmove(self.key, self.processing_key, 'LEFT', 'RIGHT')
+        if first is None:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for _ in range(limit - 1):
+            pipe.lmove(self.key, self.processing_key, 'LEFT', 'RIGHT')
+        raw = [first, *(item for item in pipe.execute() if item is not None)]
+        return [json.loads(item) for item in raw]
+
+    def ack(self):
+        self.client.delete(self.processing_key)
+
+    def depth(self):
+        return self.client.llen(self.key)
+
+    def dead_letters(self):
+        return self.client.llen(self.dead_letter_key)
+
+    def drain(self, limit=None, timeout=0):
+        """
+        Claims, ingests and acknowledges one batch; returns the number of payloads consumed.
+
+        When the batch fails its callbacks are applied one by one, and those
+        that still fail are dead-lettered. Lost connections are raised
+        instead, leaving the batch in flight for ``recover()``.
+        """
+        payloads = self.claim(limit or settings.MPESA_CALLBACK_BATCH_SIZE, timeout)
+        if payloads:
+            try:
+                ingest_mpesa_callbacks(payloads)
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception:
+                logger.exception("M-Pesa callback batch failed; applying its callbacks one by one")
+                for payload in payloads:
+                    self._ingest_one(payload)
+            self.ack()
+        return len(payloads)
+
+    def _ingest_one(self, payload):
+        try:
+            ingest_mpesa_callbacks([payload])
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception:
+            logger.exception("Dead-lettering M-Pesa callback: %r", payload)
+            self.client.rpush(self.dead_letter_key, json.dumps(payload))
+
+def process_mpesa_callback(request):
+    """Validates and buffers a Daraja callback, acknowledging without touching the database."""
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        parse_mpesa_callback(data)
+    except ValueError:
+        return JsonResponse({"ResultCode": 1, "ResultDesc": "Rejected"}, status=400)
+    MpesaCallbackBuffer().push(data)
+    return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
@@ -11,7 +11,7 @@ def send_verification_email(email, code):
         "subject": "Your Verification Code",
         "text": f"Your verification code is {code}"
     }
-    response = requests.post(SMTP_BUCKET_URL, json=email_data)
+    response = requests.post(SMTP_BUCKET_URL, json=email_data, timeout=10)
     if response.status_code != 201:
         raise Exception('Failed to send email')
     
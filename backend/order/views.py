@@ -1,34 +1,69 @@
-import random
+import uuid
+import requests
 from rest_framework import generics, viewsets,status
-from django.utils import timezone
+from django.db.models import Count
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .models import Product, Order, Cart, CartItem, CoverImages,ProductDiscountFilter, Customer
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from .models import Product, Order, Cart, CoverImages,ProductDiscountFilter, Customer, Rating, StripePayment
 from .serializers import ProductSerializer, CustomTokenObtainPairSerializer, CartSerializer, OrderSerializer,RegisterSerializer, FavoriteCountSerializer
 from .serializers import CoverImagesSerializer,EmailSerializer, ChargeSerializer, MpesaTransactionSerializer, AddToCartSerializer
-from .utils.mpesa_utils import lipa_na_mpesa_online 
+from .serializers import RatingSerializer, SendEmailSerializer, StripePaymentSerializer
+from .utils.mpesa_utils import lipa_na_mpesa_online, record_mpesa_charge, stk_push_error
 from rest_framework import filters
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, BasePermission, IsAuthenticated, SAFE_METHODS
 from django_filters.rest_framework import DjangoFilterBackend
 import stripe
 from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 import json
 from rest_framework.decorators import api_view
 from django.views.decorators.csrf import csrf_exempt
 from .utils.mpesa_utils import process_mpesa_callback
-from django.core.mail import send_mail
+from .utils.cache_utils import catalog_conditional, get_or_set_catalog, PRODUCTS, IMAGES
+from django.utils.decorators import method_decorator
+from .search import search_products
+from .suggestions import suggestion_index
+from .cart_backends import anonymous_cart_token, get_cart_backend, merge_anonymous_cart
+from .tasks import record_stripe_event_task, send_mail_task, STRIPE_EVENT_STATUSES
+from .payments import get_payment_gateway, stripe_error
 from .serializers import EmailSerializer
 
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
-class ProductListCreateAPIView(generics.ListCreateAPIView):
+class IsAdminOrReadOnly(BasePermission):
+    """Anyone may browse the catalog; only staff may change it."""
+    def has_permission(self, request, view):
+        return request.method in SAFE_METHODS or bool(request.user and request.user.is_staff)
+
+PRODUCT_ORDERING_FIELDS = ['name', 'price', 'final_price', 'discount_percentage', 'average_rating', 'rating_count']
+
+class CatalogCacheMixin:
+    """Serves list responses from the catalog cache until the namespace changes."""
+    cache_namespace = PRODUCTS
+
+    def list(self, request, *args, **kwargs):
+        endpoint = request.resolver_match.url_name if request.resolver_match else self.__class__.__name__
+        data = get_or_set_catalog(
+            self.cache_namespace, endpoint, request,
+            lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs).data,
+            extra=self.kwargs,
+        )
+        return Response(data)
+
+@method_decorator(catalog_conditional(PRODUCTS), name='dispatch')
+class ProductListCreateAPIView(CatalogCacheMixin, generics.ListCreateAPIView):
     serializer_class = ProductSerializer
+    permission_classes = [IsAdminOrReadOnly]
+    filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
+    filterset_class = ProductDiscountFilter
+    ordering_fields = PRODUCT_ORDERING_FIELDS
     
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = Product.objects.for_listing()
         category_name = self.request.query_params.get('category', None)
         if category_name is not None:
             queryset = queryset.filter(category__name=category_name)
@@ -36,25 +71,57 @@ class ProductListCreateAPIView(generics.ListCreateAPIView):
 
 
 class ProductDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.for_listing()
     serializer_class = ProductSerializer
+    permission_classes = [IsAdminOrReadOnly]
     
+@method_decorator(catalog_conditional(PRODUCTS), name='dispatch')
 class ProductSearchView(generics.GenericAPIView):
     serializer_class = ProductSerializer
+    ordering = '-rank'
 
     def get(self, request, *args, **kwargs):
         query = request.GET.get('query', '')
-        products = Product.objects.filter(name__icontains=query)
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        products = search_products(query, Product.objects.for_listing())
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
-class DiscountedProductListAPIView(generics.ListAPIView):
+@method_decorator(catalog_conditional(PRODUCTS), name='dispatch')
+class DiscountedProductListAPIView(CatalogCacheMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
     filterset_class = ProductDiscountFilter
+    ordering_fields = PRODUCT_ORDERING_FIELDS
 
     def get_queryset(self):
-        return Product.objects.filter(discount_percentage__gt=0)
+        return Product.objects.for_listing().filter(discount_percentage__gt=0)
+    
+class ProductRatingView(generics.GenericAPIView):
+    serializer_class = RatingSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not Product.objects.filter(pk=pk).exists():
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+        rating, created = Rating.objects.update_or_create(
+            product_id=pk, user=request.user,
+            defaults={'rating': serializer.validated_data['rating']},
+        )
+        rating.product = Product.objects.only('average_rating', 'rating_count').get(pk=pk)
+        return Response(
+            self.get_serializer(rating).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    def delete(self, request, pk, *args, **kwargs):
+        rating = Rating.objects.filter(product_id=pk, user=request.user).first()
+        if rating is None:
+            return Response({'error': 'Rating not found'}, status=status.HTTP_404_NOT_FOUND)
+        rating.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
     
 class FavoriteListView(generics.ListAPIView):
     serializer_class = ProductSerializer
@@ -62,7 +129,7 @@ class FavoriteListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return user.favorites.all()
+        return user.favorites.for_listing()
     
 class FavoriteCountView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
@@ -80,30 +147,45 @@ class FavoriteCountView(generics.ListAPIView):
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        merge_anonymous_cart(request, serializer.user)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
 class CartCreateAPIView(generics.CreateAPIView):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
 
 class AddToCartView(generics.GenericAPIView):
+    """
+    Adds a product to the user's cart. Anonymous visitors get a cart keyed by
+    a token in their session, which is merged into their cart on login, when
+    the cart backend supports it.
+    """
     serializer_class = AddToCartSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
+        backend = get_cart_backend()
+        if not request.user.is_authenticated and not hasattr(backend, 'add_anonymous'):
+            self.permission_denied(request)
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             product_id = serializer.validated_data['product_id']
             quantity = serializer.validated_data['quantity']
 
             try:
-                product = Product.objects.get(id=product_id)
-                cart, created = Cart.objects.get_or_create(user=request.user)
-                cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-                if created:
-                    cart_item.quantity = quantity
+                if request.user.is_authenticated:
+                    backend.add_for_user(request.user, product_id, quantity)
                 else:
-                    cart_item.quantity += quantity
-                cart_item.subtotal = cart_item.quantity * product.price
-                cart_item.save()
+                    if not Product.objects.filter(pk=product_id).exists():
+                        raise Product.DoesNotExist
+                    # Storing the token in the session makes the response set the session cookie
+                    backend.add_anonymous(anonymous_cart_token(request), product_id, quantity)
                 return Response({'message': 'Item added to cart'}, status=status.HTTP_200_OK)
             except Product.DoesNotExist:
                 return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -115,43 +197,71 @@ class OrderCreateAPIView(generics.CreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
 
-class CoverImagesViewSet(viewsets.ModelViewSet):
+@method_decorator(catalog_conditional(IMAGES), name='dispatch')
+class CoverImagesViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    cache_namespace = IMAGES
+    pagination_class = None
     queryset = CoverImages.objects.all()
     serializer_class = CoverImagesSerializer
     
 class StripeChargeView(generics.GenericAPIView):
+    """
+    Creates a PaymentIntent and returns its client secret straight away.
+
+    The browser confirms the payment with Stripe.js and the final status is
+    recorded from the webhook. Repeating a request with the same
+    Idempotency-Key header (or ``idempotency_key`` field) returns the same
+    intent instead of charging twice. Keys are scoped to the user; anonymous
+    requests always create a new intent, since nothing ties a retry to the
+    client that sent the first request.
+    """
     serializer_class = ChargeSerializer
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        user = request.user if request.user.is_authenticated else None
+        key = None
+        if user is not None:
+            key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
 
-        stripe_token = serializer.validated_data['stripe_token']
-        amount = serializer.validated_data['amount']
-        currency = serializer.validated_data['currency']
-        description = serializer.validated_data.get('description', 'A Django charge')
-
-        try:
-            charge = stripe.Charge.create(
-                amount=amount,
-                currency=currency,
-                description=description,
-                source=stripe_token,
-            )
-            return Response({'charge': charge}, status=status.HTTP_200_OK)
-        except stripe.error.StripeError as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        payment, created = StripePayment.objects.get_or_create(user=user, idempotency_key=key or uuid.uuid4().hex, defaults={
+            'amount': data['amount'],
+            'currency': data['currency'],
+            'description': data['description'],
+        })
+        if (payment.amount, payment.currency, payment.description) != (data['amount'], data['currency'], data['description']):
+            return Response({'error': 'Idempotency key reused with different parameters'}, status=status.HTTP_409_CONFLICT)
+        if payment.intent_id is None:
+            try:
+                intent = get_payment_gateway().create_intent(
+                    payment.amount, payment.currency, payment.description, payment.gateway_idempotency_key(),
+                    metadata={'payment_id': payment.pk},
+                )
+            except stripe.error.StripeError as exc:
+                message, status_code = stripe_error(exc)
+                return Response({'error': message}, status=status_code)
+            payment.intent_id = intent['id']
+            payment.client_secret = intent['client_secret']
+            payment.status = intent['status']
+            payment.save(update_fields=['intent_id', 'client_secret', 'status', 'updated_at'])
+        return Response(
+            StripePaymentSerializer(payment).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
         
+@method_decorator(catalog_conditional(PRODUCTS, version=suggestion_index.current_version), name='dispatch')
 class SearchSuggestionsView(generics.GenericAPIView):
-    serializer_class = ProductSerializer
-    
+    pagination_class = None
+
     def get(self, request, *args, **kwargs):
         query = request.GET.get('query', '')
-        if query:
-            suggestions = Product.objects.filter(name__istartswith=query).order_by('name')[:10]
-            serializer = self.get_serializer(suggestions, many=True)
-            return Response(serializer.data)
-        return Response([])
+        suggestions = suggestion_index.lookup(query)
+        return Response([
+            dict(item, thumbnail=item['thumbnail'] and request.build_absolute_uri(item['thumbnail']))
+            for item in suggestions
+        ])
     
 class MpesaChargeView(generics.GenericAPIView):
     serializer_class = MpesaTransactionSerializer
@@ -165,13 +275,15 @@ class MpesaChargeView(generics.GenericAPIView):
             transaction_desc = serializer.validated_data.get('transaction_desc', 'Payment for XYZ')
 
             # Initiate the M-Pesa transaction
-            response = lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_desc)
+            try:
+                response = lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_desc)
+            except requests.RequestException as exc:
+                message, status_code = stk_push_error(exc)
+                return Response({'error': message}, status=status_code)
 
-            # Save transaction in the database
-            if response.get('ResponseCode') == '0':  # assuming '0' is success
-                serializer.save(status='Success')
-            else:
-                serializer.save(status='Failed')
+            # Record the charge; the callback consumer settles it by CheckoutRequestID
+            user = request.user if request.user.is_authenticated else None
+            record_mpesa_charge(response, serializer.validated_data, user)
 
             return Response(response, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -189,16 +301,13 @@ class RegisterView(generics.GenericAPIView):
 @api_view(['POST'])
 def send_email(request):
     if request.method == 'POST':
-        serializer = EmailSerializer(data=request.data)
+        serializer = SendEmailSerializer(data=request.data)
         if serializer.is_valid():
-            try:
-                send_mail(serializer.validated_data['subject'],
-                          serializer.validated_data['text'],
-                          'sender@example.com',
-                          [serializer.validated_data['to']])
-                return Response({'message': 'Email sent successfully'}, status=status.HTTP_200_OK)
-            except Exception as e:
-                return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            send_mail_task.delay(serializer.validated_data['subject'],
+                                 serializer.validated_data['text'],
+                                 'sender@example.com',
+                                 [serializer.validated_data['to']])
+            return Response({'message': 'Email queued'}, status=status.HTTP_202_ACCEPTED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     else:
@@ -213,3 +322,16 @@ def get_mpesa_public_key(request):
 @csrf_exempt
 def mpesa_callback(request):
     return process_mpesa_callback(request)
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """Verifies the signature and queues PaymentIntent events; everything else is acknowledged and ignored."""
+    try:
+        event = get_payment_gateway().parse_webhook(request.body, request.headers.get('Stripe-Signature', ''))
+        event_type, intent = event['type'], event['data']['object']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Invalid webhook'}, status=400)
+    if event_type in STRIPE_EVENT_STATUSES:
+        record_stripe_event_task.delay(event['id'], event_type, intent['id'], event['created'])
+    return JsonResponse({'received': True})
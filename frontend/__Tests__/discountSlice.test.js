@@ -1,6 +1,6 @@
 import { configureStore } from '@reduxjs/toolkit';
 import axios from 'axios';
-import reducer, { fetchDiscountedProducts } from 'store/discountsSlice';
+import reducer, { fetchDiscountedProducts, fetchMoreDiscountedProducts } from 'store/discountsSlice';
 
 jest.mock('axios');
 
@@ -25,7 +25,9 @@ describe('discounts slice', () => {
     it('should handle initial state', () => {
       expect(store.getState().discount).toEqual({
         items: [],
+        nextCursor: null,
         loading: false,
+        loadingMore: false,
         error: null,
       });
     });
@@ -35,23 +37,52 @@ describe('discounts slice', () => {
       store.dispatch(action);
       expect(store.getState().discount).toEqual({
         items: [],
+        nextCursor: null,
         loading: true,
+        loadingMore: false,
         error: null,
       });
     });
 
     it('should handle fetchDiscountedProducts fulfilled', async () => {
       const responseData = [{ id: 1, name: 'Product 1', discount_percentage: 20 }];
-      axios.get.mockResolvedValue({ data: responseData });
+      axios.get.mockResolvedValue({ data: { results: responseData, next_cursor: 'abc' } });
 
       await store.dispatch(fetchDiscountedProducts());
       expect(store.getState().discount).toEqual({
         items: responseData,
+        nextCursor: 'abc',
         loading: false,
+        loadingMore: false,
         error: null,
       });
     });
 
+    it('should load the next page with the stored cursor', async () => {
+      const firstPage = [{ id: 1, name: 'Product 1', discount_percentage: 20 }];
+      const secondPage = [{ id: 2, name: 'Product 2', discount_percentage: 10 }];
+      axios.get.mockResolvedValueOnce({ data: { results: firstPage, next_cursor: 'abc' } });
+      await store.dispatch(fetchDiscountedProducts());
+
+      axios.get.mockResolvedValueOnce({ data: { results: secondPage, next_cursor: null } });
+      await store.dispatch(fetchMoreDiscountedProducts());
+
+      expect(axios.get).toHaveBeenLastCalledWith('http://127.0.0.1:8000/api/discounted-products/?cursor=abc');
+      expect(store.getState().discount).toEqual({
+        items: [...firstPage, ...secondPage],
+        nextCursor: null,
+        loading: false,
+        loadingMore: false,
+        error: null,
+      });
+    });
+
+    it('should not load more without a cursor', async () => {
+      axios.get.mockClear();
+      await store.dispatch(fetchMoreDiscountedProducts());
+      expect(axios.get).not.toHaveBeenCalled();
+    });
+
     it('should handle fetchDiscountedProducts rejected', async () => {
       const error = new Error('Network Error');
       axios.get.mockRejectedValue(error);
@@ -59,7 +90,9 @@ describe('discounts slice', () => {
       await store.dispatch(fetchDiscountedProducts());
       expect(store.getState().discount).toEqual({
         items: [],
+        nextCursor: null,
         loading: false,
+        loadingMore: false,
         error: error.message,
       });
     });
@@ -1,9 +1,12 @@
-import productsReducer, { fetchProducts } from 'store/productsSlice';
+import productsReducer, { fetchMoreProducts, fetchProducts } from 'store/productsSlice';
 
 describe('products reducer', () => {
     const initialState = {
         items: [],
+        category: '',
+        nextCursor: null,
         loading: false,
+        loadingMore: false,
         error: null,
     };
 
@@ -19,9 +22,29 @@ describe('products reducer', () => {
 
     it('should handle fetchProducts.fulfilled', () => {
         const newProducts = [{ id: 1, name: 'Product 1' }];
-        const action = { type: fetchProducts.fulfilled.type, payload: newProducts };
+        const action = { type: fetchProducts.fulfilled.type, payload: { items: newProducts, nextCursor: 'abc' } };
         const state = productsReducer(initialState, action);
-        expect(state).toEqual({ ...initialState, items: newProducts, loading: false });
+        expect(state).toEqual({ ...initialState, items: newProducts, nextCursor: 'abc', loading: false });
+    });
+
+    it('should append the next page on fetchMoreProducts.fulfilled', () => {
+        const loaded = { ...initialState, items: [{ id: 1 }], nextCursor: 'abc', loadingMore: true };
+        const action = {
+            type: fetchMoreProducts.fulfilled.type,
+            payload: { items: [{ id: 2 }], nextCursor: null, cursor: 'abc' },
+        };
+        const state = productsReducer(loaded, action);
+        expect(state).toEqual({ ...initialState, items: [{ id: 1 }, { id: 2 }] });
+    });
+
+    it('should drop a page fetched for a list that was refetched', () => {
+        const refetched = { ...initialState, items: [{ id: 3 }], nextCursor: 'xyz', loadingMore: true };
+        const action = {
+            type: fetchMoreProducts.fulfilled.type,
+            payload: { items: [{ id: 2 }], nextCursor: null, cursor: 'abc' },
+        };
+        const state = productsReducer(refetched, action);
+        expect(state).toEqual({ ...refetched, loadingMore: false });
     });
 
     it('should handle fetchProducts.rejected', () => {
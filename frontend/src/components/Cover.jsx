@@ -38,6 +38,8 @@ const cover = () => {
           key={image.id}
           id="carouselImage"
           src={`${image.image}`}
+          srcSet={image.image_variants.srcset && image.image_variants.srcset.webp}
+          sizes="100vw"
           alt={image.title}
           className={`carousel-image ${index === currentIndex ? 'active' : ''}`}
         />
@@ -0,0 +1,42 @@
+import React, { useEffect, useRef } from 'react';
+import PropTypes from 'prop-types';
+
+// Loads the next page when the end of a list scrolls into view, with a button
+// for browsers without IntersectionObserver.
+const LoadMore = ({ hasMore, loading, onLoadMore }) => {
+  const sentinel = useRef(null);
+
+  useEffect(() => {
+    if (!hasMore || loading || !sentinel.current || !('IntersectionObserver' in window)) {
+      return undefined;
+    }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        onLoadMore();
+      }
+    }, { rootMargin: '200px' });
+    observer.observe(sentinel.current);
+    return () => observer.disconnect();
+  }, [hasMore, loading, onLoadMore]);
+
+  if (!hasMore) {
+    return null;
+  }
+  return (
+    <div ref={sentinel} className="loadmore">
+      {loading ? (
+        <p>Loading...</p>
+      ) : (
+        <button type="button" onClick={onLoadMore}>Load more</button>
+      )}
+    </div>
+  );
+};
+
+LoadMore.propTypes = {
+  hasMore: PropTypes.bool.isRequired,
+  loading: PropTypes.bool.isRequired,
+  onLoadMore: PropTypes.func.isRequired,
+};
+
+export default LoadMore;
@@ -102,7 +102,7 @@ const SearchBar = () => {
           <ul className="suggestions">
             {sortedSuggestions.map((item) => (
               <li key={item.id} className="suggestion-item" onClick={() => handleSuggestionClick(item)}>
-                <img src={item.image} alt={item.name} className="suggestion-image" />
+                <img src={item.thumbnail} alt={item.name} className="suggestion-image" />
                 <span className="suggestion-name">{item.name}</span>
               </li>
             ))}
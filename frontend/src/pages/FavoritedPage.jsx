@@ -1,12 +1,13 @@
-import React, { useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useState } from 'react';
 import { useSelector, useDispatch } from 'react-redux';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faStar } from '@fortawesome/free-solid-svg-icons';
-import { fetchFavoritesThunk } from '../store/favoriteSlice';
+import { fetchFavoritesThunk, fetchMoreFavoritesThunk } from '../store/favoriteSlice';
 import NotificationBar from '../components/NotificationBar';
 import SearchBar from '../components/SearchBar';
 import NavButtons from '../components/NavButtons';
 import ModalContent from '../components/Modal';
+import LoadMore from '../components/LoadMore';
 
 const FavoritedPage = () => {
   const dispatch = useDispatch();
@@ -18,7 +19,10 @@ const FavoritedPage = () => {
     dispatch(fetchFavoritesThunk());
   }, [dispatch]);
 
-  const { items = [], loading, error } = favorites;
+  const {
+    items = [], loading, loadingMore, nextCursor, error,
+  } = favorites;
+  const loadMore = useCallback(() => dispatch(fetchMoreFavoritesThunk()), [dispatch]);
 
   const handleItemClick = (item, event) => {
     const rect = event.target.getBoundingClientRect();
@@ -36,7 +40,12 @@ const FavoritedPage = () => {
             %
           </span>
           )}
-          <img src={item.image} alt={item.name} />
+          <img
+            src={item.image}
+            srcSet={item.image_variants.srcset && item.image_variants.srcset.webp}
+            sizes="(max-width: 768px) 50vw, 480px"
+            alt={item.name}
+          />
           <p className="itemname">{item.name}</p>
           {[...Array(5)].map((_, i) => (
             <FontAwesomeIcon
@@ -72,6 +81,9 @@ const FavoritedPage = () => {
         )}
         <span className="tooltip-text">View More</span>
       </div>
+      {!loading && !error && (
+        <LoadMore hasMore={Boolean(nextCursor)} loading={loadingMore} onLoadMore={loadMore} />
+      )}
       {selectedItem && (
         <div className="modal-background" onClick={() => setSelectedItem(null)}>
           <ModalContent item={selectedItem} onClose={() => setSelectedItem(null)} position={modalPosition} />
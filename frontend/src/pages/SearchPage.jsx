@@ -1,15 +1,16 @@
-import React, { useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useState } from 'react';
 import { useSelector, useDispatch } from 'react-redux';
 import { useLocation, useNavigate } from 'react-router-dom';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faStar } from '@fortawesome/free-solid-svg-icons';
-import { fetchProducts } from '../store/productsSlice';
-import { fetchDiscountedProducts } from '../store/discountsSlice';
-import { searchProducts, updateQuery } from '../store/searchSlice';
+import { fetchMoreProducts, fetchProducts } from '../store/productsSlice';
+import { fetchDiscountedProducts, fetchMoreDiscountedProducts } from '../store/discountsSlice';
+import { fetchMoreSearchResults, searchProducts, updateQuery } from '../store/searchSlice';
 import NotificationBar from '../components/NotificationBar';
 import SearchBar from '../components/SearchBar';
 import NavButtons from '../components/NavButtons';
 import ModalContent from '../components/Modal';
+import LoadMore from '../components/LoadMore';
 
 const useQuery = () => new URLSearchParams(useLocation().search);
 
@@ -46,6 +47,16 @@ const SearchPage = () => {
 
   const { results: searchItems, loading: searchLoading, error: searchError } = search;
   const { items = [], loading, error: fetchError } = discounted ? discount : products;
+  let listing = products;
+  let fetchMore = fetchMoreProducts;
+  if (searchQuery) {
+    listing = search;
+    fetchMore = fetchMoreSearchResults;
+  } else if (discounted) {
+    listing = discount;
+    fetchMore = fetchMoreDiscountedProducts;
+  }
+  const loadMore = useCallback(() => dispatch(fetchMore()), [dispatch, fetchMore]);
 
   const handleItemClick = (item, event) => {
     const rect = event.target.getBoundingClientRect();
@@ -63,7 +74,12 @@ const SearchPage = () => {
             %
           </span>
           )}
-          <img src={item.image} alt={item.name} />
+          <img
+            src={item.image}
+            srcSet={item.image_variants.srcset && item.image_variants.srcset.webp}
+            sizes="(max-width: 768px) 50vw, 480px"
+            alt={item.name}
+          />
           <p className="itemname">{item.name}</p>
           {[...Array(5)].map((_, i) => (
             <FontAwesomeIcon
@@ -136,6 +152,13 @@ const SearchPage = () => {
         {renderContent()}
         <span className="tooltip-text">View More</span>
       </div>
+      {!listing.loading && !listing.error && (
+        <LoadMore
+          hasMore={Boolean(listing.nextCursor)}
+          loading={listing.loadingMore}
+          onLoadMore={loadMore}
+        />
+      )}
       {selectedItem && (
         <div className="modal-background" onClick={() => setSelectedItem(null)}>
           <ModalContent item={selectedItem} onClose={() => setSelectedItem(null)} position={modalPosition} />
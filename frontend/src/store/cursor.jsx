@@ -0,0 +1,27 @@
+/* eslint-disable no-param-reassign */
+// Helpers for the API's keyset pagination: list responses carry `results` and
+// `next_cursor`, and the next page is the same URL with `cursor=<next_cursor>`.
+
+export const withCursor = (url, cursor) => `${url}${url.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}`;
+
+export const pageOf = (data) => ({ items: data.results, nextCursor: data.next_cursor });
+
+export const canLoadMore = (state) => Boolean(state.nextCursor) && !state.loading && !state.loadingMore;
+
+// Reducer cases for a load-more thunk whose payload is `{ items, nextCursor, cursor }`.
+// A page is dropped when the list was refetched while it loaded.
+export const addLoadMoreCases = (builder, thunk, itemsKey = 'items') => builder
+  .addCase(thunk.pending, (state) => {
+    state.loadingMore = true;
+  })
+  .addCase(thunk.fulfilled, (state, action) => {
+    state.loadingMore = false;
+    if (state.nextCursor === action.payload.cursor) {
+      state[itemsKey] = state[itemsKey].concat(action.payload.items);
+      state.nextCursor = action.payload.nextCursor;
+    }
+  })
+  .addCase(thunk.rejected, (state, action) => {
+    state.loadingMore = false;
+    state.error = action.payload || action.error.message;
+  });
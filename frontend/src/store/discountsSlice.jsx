@@ -1,19 +1,37 @@
+/* eslint-disable no-param-reassign */
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import axios from 'axios';
+import {
+  addLoadMoreCases, canLoadMore, pageOf, withCursor,
+} from './cursor';
+
+const DISCOUNTED_URL = 'http://127.0.0.1:8000/api/discounted-products/';
 
 export const fetchDiscountedProducts = createAsyncThunk(
   'discount/fetchDiscountedProducts',
   async () => {
-    const response = await axios.get('http://127.0.0.1:8000/api/discounted-products/');
-    return response.data;
+    const response = await axios.get(DISCOUNTED_URL);
+    return pageOf(response.data);
+  },
+);
+
+export const fetchMoreDiscountedProducts = createAsyncThunk(
+  'discount/fetchMoreDiscountedProducts',
+  async (_, { getState }) => {
+    const { nextCursor } = getState().discount;
+    const response = await axios.get(withCursor(DISCOUNTED_URL, nextCursor));
+    return { ...pageOf(response.data), cursor: nextCursor };
   },
+  { condition: (_, { getState }) => canLoadMore(getState().discount) },
 );
 
 const discountSlice = createSlice({
   name: 'discount',
   initialState: {
     items: [],
+    nextCursor: null,
     loading: false,
+    loadingMore: false,
     error: null,
   },
   extraReducers: (builder) => {
@@ -21,15 +39,18 @@ const discountSlice = createSlice({
       .addCase(fetchDiscountedProducts.pending, (state) => {
         state.loading = true;
         state.error = null;
+        state.nextCursor = null;
       })
       .addCase(fetchDiscountedProducts.fulfilled, (state, action) => {
         state.loading = false;
-        state.items = action.payload;
+        state.items = action.payload.items;
+        state.nextCursor = action.payload.nextCursor;
       })
       .addCase(fetchDiscountedProducts.rejected, (state, action) => {
         state.loading = false;
         state.error = action.error.message;
       });
+    addLoadMoreCases(builder, fetchMoreDiscountedProducts);
   },
 });
 
@@ -1,15 +1,31 @@
+/* eslint-disable no-param-reassign */
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import axios from 'axios';
+import {
+  addLoadMoreCases, canLoadMore, pageOf, withCursor,
+} from './cursor';
+
+const FAVORITES_URL = 'http://127.0.0.1:8000/api/favorites/';
 
 export const fetchFavoritesThunk = createAsyncThunk('favorites/fetch', async (_, { rejectWithValue }) => {
   try {
-    const response = await axios.get('http://127.0.0.1:8000/api/favorites/');
-    return response.data;
+    const response = await axios.get(FAVORITES_URL);
+    return pageOf(response.data);
   } catch (error) {
     return rejectWithValue(error.response.data);
   }
 });
 
+export const fetchMoreFavoritesThunk = createAsyncThunk('favorites/fetchMore', async (_, { getState, rejectWithValue }) => {
+  const { nextCursor } = getState().favorites;
+  try {
+    const response = await axios.get(withCursor(FAVORITES_URL, nextCursor));
+    return { ...pageOf(response.data), cursor: nextCursor };
+  } catch (error) {
+    return rejectWithValue(error.response.data);
+  }
+}, { condition: (_, { getState }) => canLoadMore(getState().favorites) });
+
 export const fetchFavoriteCountThunk = createAsyncThunk('favorites/fetchCount', async (_, { rejectWithValue }) => {
   try {
     const response = await axios.get('http://127.0.0.1:8000/api/favorites/count/');
@@ -24,7 +40,9 @@ const favoriteSlice = createSlice({
   initialState: {
     count: 0,
     items: [],
+    nextCursor: null,
     loading: false,
+    loadingMore: false,
     error: null,
   },
   reducers: {
@@ -52,15 +70,18 @@ const favoriteSlice = createSlice({
       .addCase(fetchFavoritesThunk.pending, (state) => {
         state.loading = true;
         state.error = null;
+        state.nextCursor = null;
       })
       .addCase(fetchFavoritesThunk.fulfilled, (state, action) => {
-        state.items = action.payload;
+        state.items = action.payload.items;
+        state.nextCursor = action.payload.nextCursor;
         state.loading = false;
       })
       .addCase(fetchFavoritesThunk.rejected, (state, action) => {
         state.error = action.payload;
         state.loading = false;
       });
+    addLoadMoreCases(builder, fetchMoreFavoritesThunk);
   },
 });
 
@@ -2,20 +2,53 @@ import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import { CardElement } from '@stripe/react-stripe-js';
 import axios from 'axios';
 
+// Short, stable digest of what is being paid for
+export const cartFingerprint = (items, amount) => {
+  const lines = [...items]
+    .sort((a, b) => a.id - b.id)
+    .map((item) => `${item.id}x${item.quantity}`)
+    .join(',');
+  let hash = 5381;
+  for (let i = 0; i < lines.length; i += 1) {
+    hash = ((hash * 33) ^ lines.charCodeAt(i)) >>> 0; // eslint-disable-line no-bitwise
+  }
+  return `${amount}-${hash.toString(16)}`;
+};
+
+// Reuses the stored key while the cart is unchanged, so a retry after a
+// failed or declined attempt reaches the same PaymentIntent; a changed cart
+// gets a fresh key instead of a 409 from the server.
+export const paymentKeyFor = (storedKey, fingerprint) => (
+  storedKey && storedKey.startsWith(`${fingerprint}:`) ? storedKey : `${fingerprint}:${crypto.randomUUID()}`
+);
+
 export const processPayment = createAsyncThunk(
   'payment/processPayment',
-  async ({ stripe, elements, selectedOption }, { rejectWithValue }) => {
+  async ({ stripe, elements, selectedOption }, { getState, dispatch, rejectWithValue }) => {
     if (selectedOption === 'card' && stripe && elements) {
       const cardElement = elements.getElement(CardElement);
       try {
-        const { token } = await stripe.createToken(cardElement);
-        const response = await axios.post('http://127.0.0.1:8000/api/stripe/charge', {
-          token: token.id,
-          amount: 1000,
+        const amount = 1000;
+        const idempotencyKey = paymentKeyFor(
+          getState().payment.idempotencyKey,
+          cartFingerprint(getState().cart.items, amount),
+        );
+        // eslint-disable-next-line no-use-before-define
+        dispatch(setIdempotencyKey(idempotencyKey));
+        const response = await axios.post('http://127.0.0.1:8000/api/stripe/', {
+          amount,
+        }, {
+          headers: { 'Idempotency-Key': idempotencyKey },
         });
-        return response.data;
+        const { error, paymentIntent } = await stripe.confirmCardPayment(response.data.client_secret, {
+          payment_method: { card: cardElement },
+        });
+        if (error) {
+          return rejectWithValue(error);
+        }
+        return { ...response.data, status: paymentIntent.status };
       } catch (error) {
-        return rejectWithValue(error.response.data);
+        return rejectWithValue(error.response ? error.response.data : error.message);
       }
     } else {
       return `Selected payment method: ${selectedOption}`;
@@ -29,11 +62,16 @@ const paymentSlice = createSlice({
     selectedOption: '',
     status: 'idle',
     error: null,
+    // Kept until the payment succeeds
+    idempotencyKey: null,
   },
   reducers: {
     setSelectedOption: (state, action) => {
       state.selectedOption = action.payload;
     },
+    setIdempotencyKey: (state, action) => {
+      state.idempotencyKey = action.payload;
+    },
   },
   extraReducers: (builder) => {
     builder
@@ -42,6 +80,7 @@ const paymentSlice = createSlice({
       })
       .addCase(processPayment.fulfilled, (state) => {
         state.status = 'succeeded';
+        state.idempotencyKey = null;
       })
       .addCase(processPayment.rejected, (state, action) => {
         state.status = 'failed';
@@ -50,6 +89,6 @@ const paymentSlice = createSlice({
   },
 });
 
-export const { setSelectedOption } = paymentSlice.actions;
+export const { setSelectedOption, setIdempotencyKey } = paymentSlice.actions;
 
 export default paymentSlice.reducer;
@@ -1,45 +1,77 @@
 /* eslint-disable no-param-reassign */
 import { createAsyncThunk, createSlice } from '@reduxjs/toolkit';
+import {
+  addLoadMoreCases, canLoadMore, pageOf, withCursor,
+} from './cursor';
+
+const productsUrl = (category) => {
+  let url = 'http://127.0.0.1:8000/api/products';
+  if (category) {
+    url += `?category=${category}`;
+  }
+  return url;
+};
+
+const requestProducts = async (url) => {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error('Server error occurred!');
+  }
+  return pageOf(await response.json());
+};
 
 export const fetchProducts = createAsyncThunk(
   'products/fetchProducts',
   async ({ category }, { rejectWithValue }) => {
     try {
-      let url = 'http://127.0.0.1:8000/api/products';
-      if (category) {
-        url += `?category=${category}`;
-      }
-      const response = await fetch(url);
-      if (!response.ok) {
-        throw new Error('Server error occurred!');
-      }
-      return await response.json();
+      return await requestProducts(productsUrl(category));
+    } catch (error) {
+      return rejectWithValue(error.message);
+    }
+  },
+);
+
+export const fetchMoreProducts = createAsyncThunk(
+  'products/fetchMoreProducts',
+  async (_, { getState, rejectWithValue }) => {
+    const { category, nextCursor } = getState().products;
+    try {
+      const page = await requestProducts(withCursor(productsUrl(category), nextCursor));
+      return { ...page, cursor: nextCursor };
     } catch (error) {
       return rejectWithValue(error.message);
     }
   },
+  { condition: (_, { getState }) => canLoadMore(getState().products) },
 );
 
 const productsSlice = createSlice({
   name: 'products',
   initialState: {
     items: [],
+    category: '',
+    nextCursor: null,
     loading: false,
+    loadingMore: false,
     error: null,
   },
   extraReducers: (builder) => {
     builder
-      .addCase(fetchProducts.pending, (state) => {
+      .addCase(fetchProducts.pending, (state, action) => {
         state.loading = true;
+        state.category = (action.meta && action.meta.arg && action.meta.arg.category) || '';
+        state.nextCursor = null;
       })
       .addCase(fetchProducts.fulfilled, (state, action) => {
         state.loading = false;
-        state.items = action.payload;
+        state.items = action.payload.items;
+        state.nextCursor = action.payload.nextCursor;
       })
       .addCase(fetchProducts.rejected, (state, action) => {
         state.loading = false;
         state.error = action.error.message;
       });
+    addLoadMoreCases(builder, fetchMoreProducts);
   },
 });
 
@@ -1,23 +1,45 @@
+/* eslint-disable no-param-reassign */
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import axios from 'axios';
+import {
+  addLoadMoreCases, canLoadMore, pageOf, withCursor,
+} from './cursor';
 
 const initialState = {
   query: '',
   results: [],
+  nextCursor: null,
   loading: false,
+  loadingMore: false,
   error: null,
 };
 
+const searchUrl = (query) => `http://127.0.0.1:8000/api/search/?query=${query}`;
+
 export const searchProducts = createAsyncThunk(
   'search/searchProducts',
   async (query, thunkAPI) => {
     try {
-      const response = await axios.get(`http://127.0.0.1:8000/api/search/?query=${query}`);
-      return response.data;
+      const response = await axios.get(searchUrl(query));
+      return pageOf(response.data);
+    } catch (error) {
+      return thunkAPI.rejectWithValue(error.message);
+    }
+  },
+);
+
+export const fetchMoreSearchResults = createAsyncThunk(
+  'search/fetchMoreSearchResults',
+  async (_, thunkAPI) => {
+    const { query, nextCursor } = thunkAPI.getState().search;
+    try {
+      const response = await axios.get(withCursor(searchUrl(query), nextCursor));
+      return { ...pageOf(response.data), cursor: nextCursor };
     } catch (error) {
       return thunkAPI.rejectWithValue(error.message);
     }
   },
+  { condition: (_, { getState }) => canLoadMore(getState().search) },
 );
 
 const searchSlice = createSlice({
@@ -33,15 +55,18 @@ const searchSlice = createSlice({
       .addCase(searchProducts.pending, (state) => {
         state.loading = true;
         state.error = null;
+        state.nextCursor = null;
       })
       .addCase(searchProducts.fulfilled, (state, action) => {
         state.loading = false;
-        state.results = action.payload;
+        state.results = action.payload.items;
+        state.nextCursor = action.payload.nextCursor;
       })
       .addCase(searchProducts.rejected, (state, action) => {
         state.loading = false;
         state.error = action.payload;
       });
+    addLoadMoreCases(builder, fetchMoreSearchResults, 'results');
   },
 });
 